@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from datas.load_data import load_city_pos, compute_distance_matrix
+from datas import tsplib
+from methods.ACO import ACO
+from methods import numba_kernels
+
+def read_instances(source):
+    '''
+    Yield the instances one by one, so a huge source is never loaded at once.
+    source: a directory of the city files (datas/readme.md format, or TSPLIB .tsp), each file is an instance,
+            or a JSON-lines file ("-" for stdin), each line is {"id": ..., "points": [[x, y], ...]}.
+    The instance is {"id": ..., "path": ...} or {"id": ..., "points": ...},
+    a line which is not a JSON object gives {"id": line number, "error": ...}, which is not solved.
+    '''
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.endswith((".txt", ".tsp")):
+                yield dict(id = os.path.splitext(name)[0], path = os.path.join(source, name))
+        return
+    f = sys.stdin if source == "-" else open(source, "r", encoding = "UTF-8")
+    try:
+        for line_number, line in enumerate(f):
+            if not line.strip():
+                continue
+            try:
+                instance = json.loads(line)
+                if not isinstance(instance, dict):
+                    raise ValueError("Batch solve instance should be a JSON object!")
+            except ValueError as error:
+                yield dict(id = line_number, error = repr(error))
+                continue
+            instance.setdefault("id", line_number)
+            yield instance
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def init_worker(params):
+    '''
+    private methods, used in the solve_stream, don't use it outside.
+    Build the ACO of the worker, it is reused by all the instances solved in the worker.
+    '''
+    global worker_aco, worker_distance
+    worker_aco = ACO(**dict(params, show_progress = False))
+    worker_distance = np.empty(0)
+
+def solve_instance(task):
+    '''
+    private methods, used in the solve_stream, don't use it outside.
+    Solve one instance in the worker, the distance matrix and the ACO tables are
+    placed in the buffers of the worker. Return the result of the instance.
+    '''
+    global worker_distance
+    instance, engine, method = task
+    start = time.perf_counter()
+    try:
+        if "path" in instance and instance["path"].endswith(".tsp"):
+            # the distances of the TSPLIB files are rounded as their EDGE_WEIGHT_TYPE.
+            city_pos, distance_table = tsplib.load_tsplib(instance["path"])
+            city_count = len(city_pos)
+        else:
+            if "path" in instance:
+                city_pos = load_city_pos(instance["path"])
+            else:
+                city_pos = np.asarray(instance["points"], dtype = np.float64).reshape(-1, 2)
+            city_count = len(city_pos)
+            if worker_distance.size < city_count * city_count:
+                worker_distance = np.empty(city_count * city_count)
+            distance_table = compute_distance_matrix(
+                city_pos, out = worker_distance[:city_count * city_count].reshape(city_count, city_count))
+        if city_count < 3:
+            raise ValueError("Batch solve instance needs at least 3 cities!")
+        worker_aco.input_data(city_pos, distance_table, reuse = True)
+        path_best, distance_best, stop_reason = getattr(worker_aco, engine + "_iteration")(method)
+        return dict(id = instance["id"], city_count = city_count, distance = float(distance_best[-1]),
+                    path = path_best[-1].tolist(), iter_count = len(distance_best), stop_reason = stop_reason,
+                    solve_time = time.perf_counter() - start)
+    except Exception as error:
+        return dict(id = instance.get("id"), error = repr(error), solve_time = time.perf_counter() - start)
+
+def read_ahead(instances, events, slots):
+    '''
+    private methods, used in the solve_stream, don't use it outside.
+    Put the instances into events, the next instance is only read when one of the slots is free.
+    The end of the instances puts ("end", None), and an error of the source puts ("error", error).
+    '''
+    try:
+        iterator = iter(instances)
+        while True:
+            slots.acquire()
+            try:
+                instance = next(iterator)
+            except StopIteration:
+                break
+            events.put(("instance", instance))
+        events.put(("end", None))
+    except Exception as error:
+        events.put(("error", error))
+
+def solve_stream(instances, params = None, method = "acs", engine = "batch", workers = None, max_pending = None):
+    '''
+    Solve the instances on a pool of workers, and yield the results as soon as each one finishes,
+    not in the input order. A failed instance yields {"id": ..., "error": ...}.
+    params: the ACO parameters, e.g. time_budget to limit the solve time of each instance.
+    engine: "serial" or "batch".
+    max_pending: the max number of the instances submitted but not yielded yet, 2 * workers by default,
+                 the instances are only read when the pool has room for them, and the pool stops
+                 taking more when the results are not consumed.
+    '''
+    if engine not in ("serial", "batch"):
+        raise ValueError("Batch solve engine does not support!")
+    params = dict(params or {})
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or 2 * workers
+    context = numba_kernels.pool_context(params.get("backend"))
+    with ProcessPoolExecutor(max_workers = workers, mp_context = context,
+                             initializer = init_worker, initargs = (params,)) as executor:
+        # the instances are read in a thread, so a slow source (e.g. stdin) never delays the finished results.
+        events = queue.Queue()
+        slots = threading.Semaphore(max_pending)
+        threading.Thread(target = read_ahead, args = (instances, events, slots), daemon = True).start()
+        pending = 0
+        reading = True
+        while reading or pending:
+            kind, value = events.get()
+            if kind == "instance":
+                if "error" in value:
+                    # the instance which can't be read is not solved.
+                    slots.release()
+                    yield value
+                    continue
+                future = executor.submit(solve_instance, (value, engine, method))
+                future.add_done_callback(lambda future: events.put(("result", future)))
+                pending += 1
+            elif kind == "result":
+                pending -= 1
+                slots.release()
+                yield value.result()
+            elif kind == "end":
+                reading = False
+            else:
+                raise value
+
+def main():
+    parser = argparse.ArgumentParser(description = "Solve many TSP instances with the ACO, the results are streamed as JSON lines.")
+    parser.add_argument("source", help = "a directory of the city files, a JSON-lines file, or - for stdin")
+    parser.add_argument("--output", default = "-", help = "the JSON-lines file of the results, - for stdout")
+    parser.add_argument("--method", default = "acs")
+    parser.add_argument("--engine", default = "batch", choices = ["serial", "batch"])
+    parser.add_argument("--workers", type = int, default = None)
+    parser.add_argument("--max_pending", type = int, default = None)
+    parser.add_argument("--time_budget", type = float, default = None, help = "the seconds of each instance")
+    parser.add_argument("--ant_count", type = int, default = 20)
+    parser.add_argument("--alpha", type = float, default = 1)
+    parser.add_argument("--beta", type = float, default = 3)
+    parser.add_argument("--rho", type = float, default = 0.1)
+    parser.add_argument("--Q", type = float, default = 1)
+    parser.add_argument("--MAX_iter", type = int, default = 200)
+    parser.add_argument("--neighbor_count", type = int, default = 0)
+    parser.add_argument("--local_search", default = None)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args()
+
+    params = dict(ant_count = args.ant_count, alpha = args.alpha, beta = args.beta, rho = args.rho, Q = args.Q,
+                  MAX_iter = args.MAX_iter, neighbor_count = args.neighbor_count, local_search = args.local_search,
+                  time_budget = args.time_budget, seed = args.seed)
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding = "UTF-8")
+    start = time.perf_counter()
+    count = failed = 0
+    try:
+        for result in solve_stream(read_instances(args.source), params, args.method, args.engine,
+                                   args.workers, args.max_pending):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            count += 1
+            failed += "error" in result
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print("Batch solve: {} instances, {} failed, {:.2f} s".format(count, failed, time.perf_counter() - start),
+          file = sys.stderr)
+
+if __name__ == "__main__":
+    main()
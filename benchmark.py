@@ -0,0 +1,235 @@
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import multiprocessing
+import queue
+
+import numpy as np
+
+from datas.load_data import CityData
+from methods.ACO import ACO, PHASES
+from methods import numba_kernels
+from utils.telemetry import peak_memory
+
+# the engines: the iteration method and the extra ACO parameters.
+ENGINES = {
+    "serial": ("serial", {}),
+    "batch": ("batch", {}),
+    "batch_neighbor": ("batch", {"neighbor_count": 10}),
+    "parallel": ("parallel", {}),
+}
+if numba_kernels.NUMBA_AVAILABLE:
+    ENGINES["batch_numba"] = ("batch", {"backend": "numba"})
+
+def trace_phase_memory(aco, iteration, method, city_pos, distance_table):
+    '''
+    Input the data and run the iteration with tracemalloc.
+    Return the peak traced memory in MB of each phase, the max over the iterations,
+    including the tables allocated by input_data. Only the memory of this process is traced,
+    the worker processes of the parallel engine are not included.
+    '''
+    phase_memory = dict.fromkeys(PHASES, 0.0)
+    record_phase = aco.record_phase
+
+    def record(phase, now_iter, tick):
+        record_phase(phase, now_iter, tick)
+        phase_memory[phase] = max(phase_memory[phase], tracemalloc.get_traced_memory()[1] / 1024 / 1024)
+        tracemalloc.reset_peak()
+        return time.perf_counter()
+
+    aco.record_phase = record
+    tracemalloc.start()
+    try:
+        aco.input_data(city_pos, distance_table)
+        tracemalloc.reset_peak()
+        getattr(aco, iteration + "_iteration")(method)
+    finally:
+        tracemalloc.stop()
+        del aco.record_phase
+    return phase_memory
+
+def run_case(case):
+    '''
+    Run one benchmark case in a fresh process, so the peak memory belongs to the case.
+    The case is run once to warm up, once with tracemalloc to measure the peak memory of each phase,
+    and then repeats times to measure the time. The best of the repeats is reported, as timeit does,
+    the slower repeats are mostly slowed down by the other processes of the machine.
+    Return the result of the case.
+    '''
+    iteration, params = ENGINES[case["engine"]]
+    city_data = CityData()
+    _, city_pos, distance_table = city_data.get_my_cities(case["dataset_path"])
+    aco = ACO(ant_count = case["ant_count"], MAX_iter = case["MAX_iter"], use_CPUs = case["use_CPUs"],
+              seed = 0, show_progress = False, **params)
+    # the warm-up loads the lazy imports and the compiled kernels.
+    aco.input_data(city_pos, distance_table)
+    getattr(aco, iteration + "_iteration")(case["method"])
+    phase_memory = trace_phase_memory(aco, iteration, case["method"], city_pos, distance_table)
+    runs = []
+    for _ in range(case["repeats"]):
+        aco.input_data(city_pos, distance_table)
+        start = time.perf_counter()
+        getattr(aco, iteration + "_iteration")(case["method"])
+        wall_time = time.perf_counter() - start
+        runs.append(dict(wall_time = wall_time, iter_per_sec = aco.iter_count / wall_time,
+                         phase_time = aco.phase_summary()))
+    memory, children_memory = peak_memory()
+    return dict(case, wall_time = min(run["wall_time"] for run in runs),
+                iter_per_sec = max(run["iter_per_sec"] for run in runs),
+                phase_time = {phase: min(run["phase_time"][phase] for run in runs) for phase in PHASES},
+                runs = runs, phase_peak_memory_mb = phase_memory, peak_memory_mb = memory,
+                children_peak_memory_mb = children_memory, best_distance = float(aco.distance_best[aco.iter_count - 1]))
+
+def case_worker(case, results):
+    '''
+    private methods, used in the run_case_process, don't use it outside.
+    '''
+    results.put(run_case(case))
+
+def run_case_process(context, case):
+    '''
+    Run the case in its own new process, and return the result of the case.
+    '''
+    results = context.Queue()
+    process = context.Process(target = case_worker, args = (case, results))
+    process.start()
+    try:
+        while True:
+            try:
+                return results.get(timeout = 1)
+            except queue.Empty:
+                if process.exitcode not in (None, 0):
+                    raise RuntimeError("Benchmark case " + case["key"] + " failed!")
+    finally:
+        process.join()
+
+def case_key(case):
+    '''
+    Return the name of the case, the results of the same case are compared with the baseline.
+    '''
+    return "/".join([case["engine"], case["dataset"], "ants" + str(case["ant_count"]), "cpus" + str(case["use_CPUs"])])
+
+def make_cases(engines, dataset_paths, ant_counts, cpu_counts, MAX_iter, method, repeats = 5):
+    '''
+    Return the benchmark cases, only the parallel engine is run with the different CPU counts.
+    '''
+    cases = []
+    for engine in engines:
+        for path in dataset_paths:
+            for ant_count in ant_counts:
+                for use_CPUs in (cpu_counts if ENGINES[engine][0] == "parallel" else [1]):
+                    case = dict(engine = engine, dataset = os.path.splitext(os.path.basename(path))[0],
+                                dataset_path = path, ant_count = ant_count, use_CPUs = use_CPUs,
+                                MAX_iter = MAX_iter, method = method, repeats = repeats)
+                    case["key"] = case_key(case)
+                    cases.append(case)
+    return cases
+
+def compare(report, baseline, tolerance):
+    '''
+    Return the regressions of the report against the baseline:
+    the best iterations per second drop, or the best time of a phase grows, by more than tolerance.
+    The phases shorter than 1 ms in the baseline are ignored as noise.
+    '''
+    base = {result["key"]: result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = base.get(result["key"])
+        if old is None:
+            continue
+        if result["iter_per_sec"] < old["iter_per_sec"] * (1 - tolerance):
+            regressions.append((result["key"], "iter_per_sec", old["iter_per_sec"], result["iter_per_sec"]))
+        for phase in PHASES:
+            old_time = old["phase_time"].get(phase, 0.0)
+            new_time = result["phase_time"][phase]
+            if old_time > 1e-3 and new_time > old_time * (1 + tolerance):
+                regressions.append((result["key"], phase, old_time, new_time))
+    return regressions
+
+def check_backend(dataset_paths, methods, ant_count, MAX_iter):
+    '''
+    Check the numba backend against the NumPy engine, with and without the neighbor lists:
+    the same seed should give the same best distance of each iteration.
+    Return the mismatches, (dataset, method, neighbor_count, numpy distance, numba distance).
+    '''
+    city_data = CityData()
+    mismatches = []
+    for path in dataset_paths:
+        _, city_pos, distance_table = city_data.get_my_cities(path)
+        for method in methods:
+            for neighbor_count in (0, 10):
+                distance = {}
+                for backend in ("numpy", "numba"):
+                    aco = ACO(ant_count = ant_count, MAX_iter = MAX_iter, neighbor_count = neighbor_count,
+                              backend = backend, seed = 0, show_progress = False)
+                    aco.input_data(city_pos, distance_table)
+                    distance[backend] = aco.batch_iteration(method)[1].copy()
+                if not np.allclose(distance["numpy"], distance["numba"]):
+                    mismatches.append((os.path.basename(path), method, neighbor_count,
+                                       distance["numpy"][-1], distance["numba"][-1]))
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark the ACO engines with the per-phase timing.")
+    parser.add_argument("--engines", nargs = "+", default = list(ENGINES), choices = list(ENGINES))
+    parser.add_argument("--datasets", nargs = "+", default = None,
+                        help = "the data files, all the datas/*.txt by default")
+    parser.add_argument("--ant_counts", nargs = "+", type = int, default = [20, 100])
+    parser.add_argument("--cpu_counts", nargs = "+", type = int, default = [1, 2, 4])
+    parser.add_argument("--MAX_iter", type = int, default = 5)
+    parser.add_argument("--method", default = "cycle")
+    parser.add_argument("--repeats", type = int, default = 5, help = "the timed runs of each case")
+    parser.add_argument("--output", default = os.path.join("results", "benchmark.json"))
+    parser.add_argument("--baseline", default = None, help = "the report to compare with")
+    parser.add_argument("--tolerance", type = float, default = 0.1)
+    parser.add_argument("--check_backend", action = "store_true",
+                        help = "only check the numba backend gives the same results as the NumPy engine")
+    args = parser.parse_args()
+
+    dataset_paths = args.datasets or sorted(glob.glob(os.path.join("datas", "*.txt")))
+    if args.check_backend:
+        if not numba_kernels.NUMBA_AVAILABLE:
+            sys.exit("numba is not installed")
+        mismatches = check_backend(dataset_paths, ["cycle", "mmas", "acs"], min(args.ant_counts), args.MAX_iter)
+        for dataset, method, neighbor_count, old, new in mismatches:
+            print("MISMATCH", dataset, method, "neighbor_count", neighbor_count, old, "->", new)
+        if mismatches:
+            sys.exit(1)
+        print("The numba backend matches the NumPy engine")
+        return
+    cases = make_cases(args.engines, dataset_paths, args.ant_counts, args.cpu_counts, args.MAX_iter, args.method,
+                       args.repeats)
+    results = []
+    # the cases are run one by one, each in a fresh process.
+    context = multiprocessing.get_context("spawn")
+    for case in cases:
+        result = run_case_process(context, case)
+        print("{key}: {iter_per_sec:.3f} it/s, {wall_time:.3f} s (best of {repeats})".format(**result))
+        results.append(result)
+
+    report = dict(created = datetime.datetime.now().isoformat(timespec = "seconds"),
+                  platform = platform.platform(), python = platform.python_version(),
+                  numpy = np.__version__, cpu_count = os.cpu_count(), results = results)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok = True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent = 1)
+    print("The report is saved to", args.output)
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for key, metric, old, new in regressions:
+            print("REGRESSION", key, metric, old, "->", new)
+        if regressions:
+            sys.exit(1)
+        print("No regression against", args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,119 @@
 import numpy as np
 import random
-import math
+import hashlib
+import os
+from datas import tsplib
+
+# the directory of the data files, so the paths don't depend on the working directory.
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def compute_distance_matrix(city_pos, dtype = np.float64, block_size = 1 << 22, out = None):
+    '''
+    Return the euclidean distance matrix of the cities, NDArray(n*n).
+    The distance of a city to itself is 9999999.
+    The rows are computed block by block, each block has about block_size elements,
+    so the temporary arrays stay small for the large n.
+    out: NDArray(n*n) of the dtype to write the matrix into, or None to allocate it.
+    '''
+    city_pos = np.asarray(city_pos, dtype = np.float64)
+    city_count = len(city_pos)
+    distance = np.empty((city_count, city_count), dtype = dtype) if out is None else out
+    rows = max(1, block_size // max(city_count, 1))
+    for start in range(0, city_count, rows):
+        end = min(start + rows, city_count)
+        distance[start:end] = np.hypot(city_pos[start:end, None, 0] - city_pos[None, :, 0],
+                                       city_pos[start:end, None, 1] - city_pos[None, :, 1])
+    np.fill_diagonal(distance, 9999999)
+    return distance
+
+def load_city_pos(path, delimiter = ","):
+    '''
+    Return the city positions NDArray(n*2) of a large file, without the city names:
+    .npy: the positions are memory-mapped,
+    .tsp: the node coordinates of the TSPLIB file,
+    others: the lines "(cityname),(longtitude),(latitude)" parsed by the C parser of NumPy.
+    '''
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode = "r")
+    if path.endswith(".tsp"):
+        return tsplib.read_tsplib(path)[1]
+    return np.loadtxt(path, delimiter = delimiter, usecols = (1, 2), ndmin = 2, encoding = "UTF-8")
+
 class CityData:
     def __init__(self) -> None:
         self.city_name = []
         self.city_pos = []
 
-    def __compute_distance_matrix__(self):
-        city_count = len(self.city_name)
-        self.Distance = np.zeros((city_count, city_count))
-        for i in range(city_count):
-            for j in range(city_count):
-                if i != j:
-                    self.Distance[i][j] = math.sqrt((self.city_pos[i][0] -
-                                                self.city_pos[j][0]) ** 2 +
-                                               (self.city_pos[i][1] -
-                                                self.city_pos[j][1]) ** 2)
-                else:
-                    self.Distance[i][j] = 9999999
+    def __compute_distance_matrix__(self, dtype = np.float64, cache_file_path = None):
+        '''
+        Compute the distance matrix of the cities.
+        If cache_file_path is given, the matrix is cached in the .npy file next to it,
+        which is named by the hash of the city positions and the dtype,
+        and the later loads memory-map the cache instead of computing again.
+        '''
+        city_pos = np.array(self.city_pos, dtype = np.float64).reshape(-1, 2)
+        dtype = np.dtype(dtype)
+        if cache_file_path is None:
+            self.Distance = compute_distance_matrix(city_pos, dtype)
+            return
+        digest = hashlib.sha1(city_pos.tobytes() + dtype.str.encode()).hexdigest()[:16]
+        root, _ = os.path.splitext(cache_file_path)
+        cache_path = root + "." + digest + "." + dtype.name + ".npy"
+        if not os.path.exists(cache_path):
+            distance = compute_distance_matrix(city_pos, dtype)
+            # write to a temporary file first, so a broken cache is never loaded.
+            temp_path = cache_path + "." + str(os.getpid()) + ".tmp"
+            with open(temp_path, "wb") as f:
+                np.save(f, distance)
+            os.replace(temp_path, cache_path)
+        self.Distance = np.load(cache_path, mmap_mode = "r")
 
-    def get_Chinese_cities(self):
+    def get_Chinese_cities(self, dtype = np.float64, use_cache = True):
         '''
         Return the 34 Chinese cities names and positions.
+        dtype: the dtype of the distance matrix, np.float32 halves the memory.
+        use_cache: cache the distance matrix next to the data file.
         Return format: (list, NDarray(34*2), NDarray(34*34))
         '''
-        with open('datas\\ChineseCities.txt','r',encoding="UTF-8") as f:
-            lines = f.readlines()
-            for line in lines:
-                words = line.split('\n')[0]
-                words = words.split(",")
-                self.city_name.append(words[0])
-                self.city_pos.append([float(words[1]),float(words[2])])
-        self.__compute_distance_matrix__()
+        load_file_path = os.path.join(DATA_DIR, "ChineseCities.txt")
+        self.read_my_cities(load_file_path)
+        self.__compute_distance_matrix__(dtype, load_file_path if use_cache else None)
         return self.city_name, np.array(self.city_pos), self.Distance
 
-    def get_my_cities(self, load_file_path:str):
+    def read_my_cities(self, load_file_path:str):
+        '''
+        Return the n cities names and positions defined in the mycites.txt,
+        without computing the distance matrix.
+        The file is read once, the positions are parsed by the C parser of NumPy,
+        use load_city_pos to skip the names.
+        Return format: (list, NDarray(n*2))
+        '''
+        with open(load_file_path, "r", encoding = "UTF-8") as f:
+            lines = [line for line in f.read().splitlines() if line.strip()]
+        self.city_name = [line.partition(",")[0] for line in lines]
+        self.city_pos = np.loadtxt(lines, delimiter = ",", usecols = (1, 2), ndmin = 2).reshape(-1, 2)
+        return self.city_name, np.array(self.city_pos)
+
+    def get_my_cities(self, load_file_path:str, dtype = np.float64, use_cache = True):
         '''
         Return the n cities names and positions defined in the mycites.txt.
+        dtype: the dtype of the distance matrix, np.float32 halves the memory.
+        use_cache: cache the distance matrix next to the data file.
         Return format: (list, NDarray(n*2), NDarray(n*n))
         '''
-        with open(load_file_path,"r",encoding="UTF-8") as f:
-            lines = f.readlines()
-            for line in lines:
-                words = line.split("\n")[0]
-                words = words.split(",")
-                self.city_name.append(words[0])
-                self.city_pos.append([float(words[1]),float(words[2])])
-        self.__compute_distance_matrix__()
+        self.read_my_cities(load_file_path)
+        self.__compute_distance_matrix__(dtype, load_file_path if use_cache else None)
+        return self.city_name, np.array(self.city_pos), self.Distance
+
+    def get_tsplib_cities(self, load_file_path:str, dtype = np.float64):
+        '''
+        Return the n cities names (the node numbers) and positions of the TSPLIB .tsp file,
+        the distance matrix is computed with the EDGE_WEIGHT_TYPE of the file.
+        The positions are NaN if the file has only the explicit edge weights.
+        Return format: (list, NDarray(n*2), NDarray(n*n))
+        '''
+        self.city_pos, self.Distance = tsplib.load_tsplib(load_file_path, dtype)
+        self.city_name = [str(i + 1) for i in range(len(self.city_pos))]
         return self.city_name, np.array(self.city_pos), self.Distance
 
     def get_random_cities_float(self, n:int, MaxLongitude: float, MaxLatitude: float, nd=2):
@@ -102,7 +169,7 @@ def main():
     # city_data.print_cities_data()
     city_data.get_random_cities_int(50, 100, 100)
     city_data.print_cities_data()
-    city_data.save_to_file("datas\\50_cities.txt")
+    city_data.save_to_file(os.path.join(DATA_DIR, "50_cities.txt"))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
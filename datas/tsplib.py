@@ -0,0 +1,145 @@
+'''
+The loader of the TSPLIB .tsp files.
+The node coordinates and the edge weights are parsed by the C parsers of NumPy
+into NDArray directly, so the large files are read in seconds.
+Supported EDGE_WEIGHT_TYPE: EUC_2D, CEIL_2D, ATT, GEO and EXPLICIT
+(FULL_MATRIX, UPPER_ROW, LOWER_ROW, UPPER_DIAG_ROW, LOWER_DIAG_ROW and the COL formats).
+'''
+import io
+import re
+
+import numpy as np
+
+# the section keywords start a line, the data of the section follows until the next keyword.
+SECTION = re.compile(r"^[ \t]*([A-Z_]+_SECTION|EOF)[ \t]*:?[ \t]*$", re.M)
+
+# the triangle of the row-major order of each explicit format, (upper, with the diagonal).
+# the COL formats of a symmetric matrix are the ROW formats of the other triangle.
+TRIANGLES = {
+    "UPPER_ROW": (True, False), "LOWER_COL": (True, False),
+    "LOWER_ROW": (False, False), "UPPER_COL": (False, False),
+    "UPPER_DIAG_ROW": (True, True), "LOWER_DIAG_COL": (True, True),
+    "LOWER_DIAG_ROW": (False, True), "UPPER_DIAG_COL": (False, True),
+}
+
+def read_tsplib(path):
+    '''
+    Read the TSPLIB .tsp file.
+    Return the specification (dict of the header, e.g. NAME, DIMENSION, EDGE_WEIGHT_TYPE),
+    the node coordinates NDArray(n*2), from NODE_COORD_SECTION or DISPLAY_DATA_SECTION,
+    None if the file has no coordinates,
+    and the explicit edge weights NDArray(n*n), None if EDGE_WEIGHT_TYPE is not EXPLICIT.
+    '''
+    with open(path, "r", encoding = "UTF-8") as f:
+        text = f.read()
+    matches = list(SECTION.finditer(text))
+    header_end = matches[0].start() if matches else len(text)
+    spec = {}
+    for line in text[:header_end].splitlines():
+        key, _, value = line.partition(":")
+        if key.strip():
+            spec[key.strip().upper()] = value.strip()
+    if "DIMENSION" not in spec:
+        raise ValueError("TSPLIB file has no DIMENSION!")
+    city_count = int(spec["DIMENSION"])
+
+    coords = None
+    weights = None
+    for i, match in enumerate(matches):
+        name = match.group(1)
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = text[match.end():end]
+        if name in ("NODE_COORD_SECTION", "DISPLAY_DATA_SECTION") and coords is None:
+            data = np.loadtxt(io.StringIO(body), ndmin = 2)
+            if len(data) != city_count:
+                raise ValueError("TSPLIB node count does not match DIMENSION!")
+            # the nodes are numbered from 1, in any order.
+            coords = np.empty((city_count, 2))
+            coords[data[:, 0].astype(int) - 1] = data[:, 1:3]
+        elif name == "EDGE_WEIGHT_SECTION":
+            weights = explicit_weights(np.fromstring(body, sep = " "), city_count,
+                                       spec.get("EDGE_WEIGHT_FORMAT", "FULL_MATRIX"))
+        elif name == "EOF":
+            break
+    return spec, coords, weights
+
+def explicit_weights(values, city_count, edge_weight_format):
+    '''
+    Return the symmetric weight matrix NDArray(n*n) from the values of the EDGE_WEIGHT_SECTION.
+    '''
+    if edge_weight_format == "FULL_MATRIX":
+        if len(values) != city_count * city_count:
+            raise ValueError("TSPLIB edge weight count does not match DIMENSION!")
+        return values.reshape(city_count, city_count).copy()
+    if edge_weight_format not in TRIANGLES:
+        raise ValueError("TSPLIB edge weight format does not support!")
+    upper, diagonal = TRIANGLES[edge_weight_format]
+    offset = 0 if diagonal else 1
+    rows, cols = np.triu_indices(city_count, offset) if upper else np.tril_indices(city_count, -offset)
+    if len(values) != len(rows):
+        raise ValueError("TSPLIB edge weight count does not match DIMENSION!")
+    weights = np.zeros((city_count, city_count))
+    weights[rows, cols] = values
+    weights[cols, rows] = values
+    return weights
+
+def geo_radians(coords):
+    '''
+    Return the latitude and longitude in radians of the GEO coordinates in the DDD.MM format.
+    The degrees are truncated as in the reference implementations of TSPLIB.
+    '''
+    degree = np.trunc(coords)
+    return 3.141592 * (degree + 5.0 * (coords - degree) / 3.0) / 180.0
+
+def tsplib_distance(city_pos, edge_weight_type, dtype = np.float64, block_size = 1 << 22, out = None):
+    '''
+    Return the distance matrix NDArray(n*n) of the coordinates with the rounding of the
+    EDGE_WEIGHT_TYPE (EUC_2D, CEIL_2D, ATT or GEO). The distance of a city to itself is 9999999.
+    The rows are computed block by block as in compute_distance_matrix.
+    '''
+    if edge_weight_type not in ("EUC_2D", "CEIL_2D", "ATT", "GEO"):
+        raise ValueError("TSPLIB edge weight type does not support!")
+    city_pos = np.asarray(city_pos, dtype = np.float64)
+    city_count = len(city_pos)
+    distance = np.empty((city_count, city_count), dtype = dtype) if out is None else out
+    if edge_weight_type == "GEO":
+        city_pos = geo_radians(city_pos)
+    rows = max(1, block_size // max(city_count, 1))
+    for start in range(0, city_count, rows):
+        end = min(start + rows, city_count)
+        x = city_pos[start:end, None, 0]
+        y = city_pos[start:end, None, 1]
+        if edge_weight_type == "GEO":
+            q1 = np.cos(y - city_pos[None, :, 1])
+            q2 = np.cos(x - city_pos[None, :, 0])
+            q3 = np.cos(x + city_pos[None, :, 0])
+            block = np.trunc(6378.388 * np.arccos(np.clip(0.5 * ((1 + q1) * q2 - (1 - q1) * q3), -1, 1)) + 1.0)
+        elif edge_weight_type == "ATT":
+            # the pseudo-euclidean distance.
+            block = np.sqrt(((x - city_pos[None, :, 0]) ** 2 + (y - city_pos[None, :, 1]) ** 2) / 10.0)
+            rounded = np.floor(block + 0.5)
+            block = np.where(rounded < block, rounded + 1, rounded)
+        else:
+            block = np.hypot(x - city_pos[None, :, 0], y - city_pos[None, :, 1])
+            block = np.floor(block + 0.5) if edge_weight_type == "EUC_2D" else np.ceil(block)
+        distance[start:end] = block
+    np.fill_diagonal(distance, 9999999)
+    return distance
+
+def load_tsplib(path, dtype = np.float64):
+    '''
+    Return the city positions and the distance matrix of the TSPLIB .tsp file.
+    The positions are NaN if the file has only the explicit edge weights.
+    Return format: (NDArray(n*2), NDArray(n*n))
+    '''
+    spec, coords, weights = read_tsplib(path)
+    city_count = int(spec["DIMENSION"])
+    if coords is None:
+        coords = np.full((city_count, 2), np.nan)
+    if spec.get("EDGE_WEIGHT_TYPE") == "EXPLICIT":
+        if weights is None:
+            raise ValueError("TSPLIB file has no EDGE_WEIGHT_SECTION!")
+        distance = weights.astype(dtype)
+        np.fill_diagonal(distance, 9999999)
+        return coords, distance
+    return coords, tsplib_distance(coords, spec.get("EDGE_WEIGHT_TYPE"), dtype)
@@ -1,8 +1,10 @@
+import os
+import argparse
 from datas.load_data import CityData
-from utils import plot
+from utils.render import Renderer
 from methods.ACO import ACO
 
-def experiment_Chinese():
+def experiment_Chinese(renderer:Renderer):
     # Get the data
     city_data = CityData()
     city_name, city_pos, distance_table = city_data.get_Chinese_cities()
@@ -10,7 +12,7 @@ def experiment_Chinese():
     # Load the model
     aco = ACO(ant_count=10000, use_CPUs=24)
     aco.input_data(city_pos, distance_table)
-    path_best, distance_best = aco.serial_iteration("constant")
+    path_best, distance_best, stop_reason = aco.serial_iteration("constant")
 
     # plot the result
     path = [city_name[i] for i in path_best[-1]]
@@ -26,18 +28,18 @@ def experiment_Chinese():
     x.append(x[0])
     y.append(y[0])
 
-    plot.plot_path(x, y, path, "results\\Chinese_city_ant_constant_path.png")
-    plot.plot_dist(distance_best, "results\\Chinese_city_ant_constant_distance.png")
+    renderer.plot_path(x, y, path, os.path.join("results", "Chinese_city_ant_constant_path.png"))
+    renderer.plot_dist(distance_best, os.path.join("results", "Chinese_city_ant_constant_distance.png"))
 
-def experiment_serial(dataset:str, method:str, ant_count=100, alpha=1, beta=6, rho=0.2, Q=50, MAX_iter=200):
+def experiment_serial(renderer:Renderer, dataset:str, method:str, ant_count=100, alpha=1, beta=6, rho=0.2, Q=50, MAX_iter=200):
     # Get the data
     city_data = CityData()
-    city_name, city_pos, distance_table = city_data.get_my_cities("datas\\"+dataset+".txt")
+    city_name, city_pos, distance_table = city_data.get_my_cities(os.path.join("datas", dataset + ".txt"))
 
     # Load the model
     aco = ACO(ant_count, alpha, beta, rho, Q, MAX_iter)
     aco.input_data(city_pos, distance_table)
-    path_best, distance_best = aco.serial_iteration(method)
+    path_best, distance_best, stop_reason = aco.serial_iteration(method)
 
     # plot the result
     path = [city_name[i] for i in path_best[-1]]
@@ -45,7 +47,7 @@ def experiment_serial(dataset:str, method:str, ant_count=100, alpha=1, beta=6, r
     print("The best path is", path)
     print("The shortest distance is", distance_best[-1])
 
-    with open("results\\result.log", "a+") as f:
+    with open(os.path.join("results", "result.log"), "a+") as f:
         f.write("ant_"+ method + "_shortest_distance_" + dataset + " is "+ str(distance_best[-1]) + "\n")
 
     x = []
@@ -56,18 +58,18 @@ def experiment_serial(dataset:str, method:str, ant_count=100, alpha=1, beta=6, r
     x.append(x[0])
     y.append(y[0])
 
-    plot.plot_path(x, y, path, "results\\"+ dataset +"_ant_"+ method + "_path_" + ".png", method, dataset)
-    plot.plot_dist(distance_best, "results\\"+ dataset +"_ant_"+ method + "_distance_" +".png", method, dataset)
+    renderer.plot_path(x, y, path, os.path.join("results", dataset +"_ant_"+ method + "_path_" + ".png"), method, dataset)
+    renderer.plot_dist(distance_best, os.path.join("results", dataset +"_ant_"+ method + "_distance_" +".png"), method, dataset)
 
-def experiment_parallel(dataset:str, method:str, ant_count=100, alpha=1, beta=6, rho=0.2, Q=50, MAX_iter=200, use_CPUs=10):
+def experiment_parallel(renderer:Renderer, dataset:str, method:str, ant_count=100, alpha=1, beta=6, rho=0.2, Q=50, MAX_iter=200, use_CPUs=10):
     # Get the data
     city_data = CityData()
-    city_name, city_pos, distance_table = city_data.get_my_cities("datas\\"+dataset+".txt")
+    city_name, city_pos, distance_table = city_data.get_my_cities(os.path.join("datas", dataset + ".txt"))
 
     # Load the model
     aco = ACO(ant_count, alpha, beta, rho, Q, MAX_iter, use_CPUs)
     aco.input_data(city_pos, distance_table)
-    path_best, distance_best = aco.parallel_iteration(method)
+    path_best, distance_best, stop_reason = aco.parallel_iteration(method)
 
     # plot the result
     path = [city_name[i] for i in path_best[-1]]
@@ -75,7 +77,7 @@ def experiment_parallel(dataset:str, method:str, ant_count=100, alpha=1, beta=6,
     print("The best path is", path)
     print("The shortest distance is", distance_best[-1])
 
-    with open("results\\result.log", "a+") as f:
+    with open(os.path.join("results", "result.log"), "a+") as f:
         f.write("ant_"+ method + "_shortest_distance_" + dataset + " is "+ str(distance_best[-1]) + "\n")
 
     x = []
@@ -86,22 +88,29 @@ def experiment_parallel(dataset:str, method:str, ant_count=100, alpha=1, beta=6,
     x.append(x[0])
     y.append(y[0])
 
-    plot.plot_path(x, y, path, "results\\"+ dataset +"_ant_"+ method + "_path_" + ".png", method, dataset)
-    plot.plot_dist(distance_best, "results\\"+ dataset +"_ant_"+ method + "_distance_" +".png", method, dataset)
+    renderer.plot_path(x, y, path, os.path.join("results", dataset +"_ant_"+ method + "_path_" + ".png"), method, dataset)
+    renderer.plot_dist(distance_best, os.path.join("results", dataset +"_ant_"+ method + "_distance_" +".png"), method, dataset)
 
 if __name__ == "__main__":
-    # experiment_Chinese()
-
-    datasets = ["oliver30","dantzig42","eil51","berlin52","st70","pr107","tsp225"]
-    methods = ["quantity","density","cycle","constant"]
-    for i in datasets:
-        for j in methods:
-            if j == "quantity":
-                experiment_serial(i,j,alpha=1,beta=5,rho=0.9,Q=50)
-            if j == "density":
-                experiment_serial(i,j,alpha=1,beta=5,rho=0.9,Q=50)
-            if j == "cycle":
-                experiment_serial(i,j,alpha=1,beta=5,rho=0.5,Q=50)
-            if j == "constant":
-                experiment_serial(i,j,alpha=1,beta=4,rho=0.3,Q=50)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--render", default="background", choices=["background", "inline", "headless"],
+                        help="render the plots in a background process, in this process, or skip them")
+    args = parser.parse_args()
+
+    # the solves continue while the plots are rendered, the renderer waits for them at the end.
+    with Renderer(args.render) as renderer:
+        # experiment_Chinese(renderer)
+
+        datasets = ["oliver30","dantzig42","eil51","berlin52","st70","pr107","tsp225"]
+        methods = ["quantity","density","cycle","constant"]
+        for i in datasets:
+            for j in methods:
+                if j == "quantity":
+                    experiment_serial(renderer,i,j,alpha=1,beta=5,rho=0.9,Q=50)
+                if j == "density":
+                    experiment_serial(renderer,i,j,alpha=1,beta=5,rho=0.9,Q=50)
+                if j == "cycle":
+                    experiment_serial(renderer,i,j,alpha=1,beta=5,rho=0.5,Q=50)
+                if j == "constant":
+                    experiment_serial(renderer,i,j,alpha=1,beta=4,rho=0.3,Q=50)
             
\ No newline at end of file
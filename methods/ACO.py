@@ -1,12 +1,107 @@
 import numpy as np
-from tqdm import tqdm
-from multiprocessing import Pool
-from multiprocessing import Array
-import ctypes
+from multiprocessing import shared_memory
+import time
+import warnings
+import json
+import os
+from methods.local_search import improve_tour
+from methods import numba_kernels
+from utils import telemetry
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+def roulette_select(weight, rand):
+    '''
+    Vectorized roulette wheel selection, one draw for each row of weight.
+    weight: NDArray(m*n), the choice weights, 0 for the cities can't be selected.
+    rand: NDArray(m), uniform random numbers in [0, 1).
+    Return the selected column of each row, the first column whose
+    cumulative weight is greater than rand * total weight of the row.
+    '''
+    cumsum_weight = weight.cumsum(axis=1)
+    total = cumsum_weight[:, -1]
+    # count the columns whose cumulative weight <= the target,
+    # which is the searchsorted(side="right") result of each row.
+    selected = (cumsum_weight <= (rand * total)[:, None]).sum(axis=1)
+    if (total <= 0).any():
+        raise FloatingPointError("All the choice weights are 0, the pheromone may be underflowed!")
+    # the rounding of rand * total may reach the end of the row,
+    # then take the last selectable column.
+    overflow = selected >= weight.shape[1]
+    if overflow.any():
+        selected[overflow] = cumsum_weight[overflow].argmax(axis=1)
+    return selected
+
+def create_shared_array(array):
+    '''
+    Copy the array into a new shared memory block.
+    Return the shared memory block, the NDArray view of it, and the spec
+    (name, shape, dtype) used by attach_shared_array in the other processes.
+    '''
+    block = shared_memory.SharedMemory(create = True, size = max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype = array.dtype, buffer = block.buf)
+    view[...] = array
+    return block, view, (block.name, array.shape, array.dtype.str)
+
+def attach_shared_array(spec):
+    '''
+    Map the shared memory block created by create_shared_array without copying.
+    Return the shared memory block and the NDArray view of it.
+    '''
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name = name)
+    return block, np.ndarray(shape, dtype = dtype, buffer = block.buf)
+
+def init_shared_worker(params, state, specs):
+    '''
+    private methods, used in the parallel_iteration, don't use it outside.
+    Build the ACO of the worker process on the shared memory blocks.
+    '''
+    global worker_aco, worker_blocks
+    # the random streams are derived from the seed of params, not from the global random state.
+    worker_aco = ACO(**params)
+    for name, value in state.items():
+        setattr(worker_aco, name, value)
+    if worker_aco.backend == "numba":
+        # the ants are already distributed over the processes.
+        numba_kernels.set_num_threads(1)
+    worker_blocks = []
+    for name, spec in specs.items():
+        block, view = attach_shared_array(spec)
+        worker_blocks.append(block)
+        setattr(worker_aco, name, view)
+
+def shared_select_path(task):
+    '''
+    private methods, used in the parallel_iteration, don't use it outside.
+    Construct the paths of the ants in the chunk [start, end) of the iteration now_iter.
+    '''
+    now_iter, start, end = task
+    rand = worker_aco.ant_rand(now_iter, start, end)
+    length, fallback = worker_aco.batch_select_path(worker_aco.candidate[start:end], rand)
+    worker_aco.length[start:end] = length
+    return fallback
+
+def shared_local_search(i):
+    '''
+    private methods, used in the parallel_iteration, don't use it outside.
+    Improve the path of the ant i with the local search.
+    '''
+    worker_aco.local_search_path(worker_aco.candidate, worker_aco.length, [i])
+
+# the phases of an iteration, their wall time is recorded in ACO.phase_time.
+PHASES = ["initial_city", "construction", "local_search", "best_path", "pheromone", "convergence", "checkpoint"]
 
 class ACO:
     def __init__(self, ant_count = 100, alpha = 1, beta = 2,
-                 rho = 0.1, Q = 1, MAX_iter = 200, use_CPUs = 10) -> None:
+                 rho = 0.1, Q = 1, MAX_iter = 200, use_CPUs = 10,
+                 neighbor_count = 0, local_search = None, local_search_ants = 1,
+                 backend = "numpy", stagnation_window = None, target_length = None,
+                 time_budget = None, branching_threshold = None, seed = None, chunk_size = 64,
+                 observers = None, show_progress = True, checkpoint_path = None, checkpoint_interval = "auto",
+                 q0 = 0.9, xi = 0.1, best_deposit = "iteration", p_best = 0.05, reinit_window = 50) -> None:
         '''
         ant_count: The total number of the ants
         alpha: The weight index factor of the pheromone
@@ -14,7 +109,69 @@ class ACO:
         rho: Volatilization rate
         Q: The amount of pheromone
         MAX_iter: Maximum iteration number
+        use_CPUs: The number of processes used in the parallel_iteration
+        neighbor_count: The length of the nearest neighbor candidate lists,
+                        0 means scoring all the unvisit cities in each step.
+        local_search: The local search applied to the paths in each iteration,
+                      None, "2-opt", "or-opt" or "2-opt+or-opt".
+        local_search_ants: The number of the best ants improved by the local search in each iteration.
+        backend: "numpy", or "numba" to run the path construction and the pheromone deposit
+                 with the compiled kernels, the ants are processed in parallel threads.
+                 It falls back to "numpy" if numba is not installed.
+                 The lean mode always uses "numpy".
+        The iteration stops before MAX_iter when one of the following conditions is met,
+        None disables the condition:
+        stagnation_window: The best distance is not improved in the last stagnation_window iterations.
+        target_length: The best distance is not longer than target_length.
+        time_budget: The iteration has run for time_budget seconds.
+        branching_threshold: The average lambda-branching factor of the pheromone (lambda = 0.05)
+                             is not greater than branching_threshold, e.g. 2.0 means
+                             each city keeps about 2 strong edges, the colony has converged.
+                             It is measured against [tau_min, tau_max] with the "mmas" method,
+                             and not used with the "acs" method.
+        seed: The seed of the random streams, the same seed gives the same paths in the
+              serial, batch and parallel iterations. None means a random seed,
+              which is kept in seed_sequence.entropy to reproduce the run.
+        chunk_size: The number of the ants sharing one random stream in an iteration,
+                    the streams are spawned from the seed by SeedSequence, so the random numbers
+                    of an ant don't depend on how the ants are split into the tasks.
+        observers: The callables called once per iteration with the stats of the iteration,
+                   see utils.telemetry for the stats and the built-in sinks.
+        show_progress: Show the progress bar, False for the headless jobs.
+        checkpoint_path: The .npz file to save the checkpoint of the iteration, None disables it,
+                         use ACO.resume to continue the iteration from it.
+        checkpoint_interval: The number of the iterations between the checkpoints, or "auto"
+                             to keep the checkpoint time under 1% of the iteration time.
+        The parameters of the "acs" method (Ant Colony System):
+        q0: The probability to select the city with the max choice weight instead of the roulette wheel.
+        xi: The local evaporation rate of the edges passed by the ants.
+        The parameters of the "mmas" method (MAX-MIN Ant System):
+        best_deposit: "iteration" or "global", only the iteration best path or the best path so far deposits.
+        p_best: The probability to construct the best path at convergence, which sets tau_min.
+        reinit_window: The pheromone is reinitialized to tau_max when the best distance
+                       is not improved in reinit_window iterations, None disables it.
         '''
+        if local_search not in (None, "2-opt", "or-opt", "2-opt+or-opt"):
+            raise ValueError("Local search method does not support!")
+        if best_deposit not in ("iteration", "global"):
+            raise ValueError("MMAS best deposit does not support!")
+        if backend not in ("numpy", "numba"):
+            raise ValueError("ACO backend does not support!")
+        if backend == "numba":
+            if numba_kernels.NUMBA_AVAILABLE:
+                # compile the kernels, or load them from the cache on disk.
+                numba_kernels.warmup()
+            else:
+                warnings.warn("numba is not installed, the numpy backend is used.")
+                backend = "numpy"
+        self.backend = backend
+        self.stagnation_window = stagnation_window
+        self.target_length = target_length
+        self.time_budget = time_budget
+        self.branching_threshold = branching_threshold
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.seed = self.seed_sequence.entropy
+        self.chunk_size = chunk_size
         self.ant_count = ant_count
         self.alpha = alpha
         self.beta = beta
@@ -22,25 +179,755 @@ class ACO:
         self.Q = Q
         self.MAX_iter = MAX_iter
         self.use_CPUs = use_CPUs
-    
-    def input_data(self, city_pos:np.ndarray, distance_table:np.ndarray):
+        self.neighbor_count = neighbor_count
+        self.local_search = local_search
+        self.local_search_ants = local_search_ants
+        self.observers = list(observers) if observers is not None else []
+        self.show_progress = show_progress
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.start_iter = 0
+        # the buffers of input_data(reuse = True).
+        self.buffers = {}
+        self.q0 = q0
+        self.xi = xi
+        self.best_deposit = best_deposit
+        self.p_best = p_best
+        self.reinit_window = reinit_window
+        # the q0 of the current method, 0 for the Ant System methods.
+        self.exploit = 0.0
+
+    def get_params(self):
+        '''
+        Return the parameters used to build a same ACO, e.g. in the worker processes.
+        The observers are not included.
+        '''
+        return dict(ant_count = self.ant_count, alpha = self.alpha, beta = self.beta,
+                    rho = self.rho, Q = self.Q, MAX_iter = self.MAX_iter,
+                    use_CPUs = self.use_CPUs, neighbor_count = self.neighbor_count,
+                    local_search = self.local_search, local_search_ants = self.local_search_ants,
+                    backend = self.backend, stagnation_window = self.stagnation_window,
+                    target_length = self.target_length, time_budget = self.time_budget,
+                    branching_threshold = self.branching_threshold, seed = self.seed,
+                    chunk_size = self.chunk_size, checkpoint_path = self.checkpoint_path,
+                    checkpoint_interval = self.checkpoint_interval, q0 = self.q0, xi = self.xi,
+                    best_deposit = self.best_deposit, p_best = self.p_best, reinit_window = self.reinit_window)
+
+    def input_data(self, city_pos:np.ndarray, distance_table:np.ndarray = None, reuse = False):
         '''
         input the data, include city_pos and distance_table.
         city_pos: NDArray(n*2),
         distance_table: NDArray(n*n)
+
+        If distance_table is None, the lean mode for the large instances is used:
+        the distances are computed from city_pos on demand, and the pheromone is
+        only stored on the edges of the neighbor lists (neighbor_count must be > 0),
+        so no n*n matrix is allocated.
+
+        If reuse is True, the tables are placed in the buffers of the previous input_data,
+        which only grow, so solving many instances with one ACO doesn't allocate again.
+        The results of the previous iteration are overwritten then.
         '''
-        self.city_pos = city_pos
-        self.distance_table = distance_table
+        self.lean = distance_table is None
         self.city_count = len(city_pos)
-        self.pheromone_table = np.ones((self.city_count, self.city_count))
-        self.path_best = np.zeros((self.MAX_iter, self.city_count), dtype = int)
-        self.distance_best = np.zeros(self.MAX_iter)
-        self.reciprocal_dist = 1.0 / self.distance_table
+        self.reuse = reuse
+        # the stream of the initial cities, the streams of the ants are spawned in ant_rand.
+        # it restarts for each input data, so the paths don't depend on the previous instances.
+        self.rng = np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key = (0,)))
+        self.path_best = self.allocate("path_best", (self.MAX_iter, self.city_count), int, 0)
+        self.distance_best = self.allocate("distance_best", self.MAX_iter, np.float64, 0)
+        self.fallback_count = self.allocate("fallback_count", self.MAX_iter, int, 0)
+        self.phase_time = {phase: self.allocate("phase_" + phase, self.MAX_iter, np.float64, 0) for phase in PHASES}
+        self.choice_table = None
+        # the flat indices of the pheromone_store changed since the last update_choice_info,
+        # None means the whole table.
+        self.dirty_edges = None
+        # tau0 of the acs method, and the last reinitialization of the mmas method.
+        self.tau0 = 1.0
+        self.reinit_iter = 0
+        if self.lean:
+            if self.neighbor_count <= 0:
+                raise ValueError("ACO lean mode needs neighbor_count > 0!")
+            self.city_pos = np.asarray(city_pos, dtype = np.float64)
+            self.distance_table = None
+            self.pheromone_table = None
+            self.heuristic = None
+            k = min(self.neighbor_count, self.city_count - 1)
+            self.neighbor_list = self.nearest_neighbors(k)
+            # the pheromone and the heuristic of the edge (i, neighbor_list[i, s]) are stored in [i, s].
+            rows = np.arange(self.city_count)[:, None]
+            self.neighbor_pheromone = self.allocate("pheromone", (self.city_count, k), np.float64, 1)
+            self.neighbor_heuristic = np.power(1.0 / self.edge_distance(rows, self.neighbor_list), self.beta)
+            edge_key = (rows * self.city_count + self.neighbor_list).ravel()
+            self.neighbor_order = np.argsort(edge_key)
+            self.neighbor_key = edge_key[self.neighbor_order]
+        else:
+            self.city_pos = city_pos
+            self.distance_table = distance_table
+            self.pheromone_table = self.allocate("pheromone", (self.city_count, self.city_count), np.float64, 1)
+            # the heuristic reciprocal_dist^beta never changes, so it is computed once.
+            self.heuristic = self.allocate("heuristic", (self.city_count, self.city_count),
+                                           np.result_type(self.distance_table.dtype, np.float16))
+            np.divide(1.0, self.distance_table, out = self.heuristic)
+            np.power(self.heuristic, self.beta, out = self.heuristic)
+            if self.neighbor_count > 0:
+                self.neighbor_list = self.nearest_neighbors(min(self.neighbor_count, self.city_count - 1))
+                self.neighbor_heuristic = self.heuristic[np.arange(self.city_count)[:, None], self.neighbor_list]
+        if self.local_search is not None and self.neighbor_count <= 0:
+            # the local search always uses the neighbor lists.
+            self.search_neighbor = self.nearest_neighbors(min(10, self.city_count - 1))
+        self.search_list = None
+
+    def allocate(self, name, shape, dtype, fill = None):
+        '''
+        private methods, used in the input_data, don't use it outside.
+        Return an NDArray of the shape filled with fill (not initialized if fill is None).
+        If reuse is True, it is a view of the buffer name, which grows when it is too small.
+        '''
+        if not self.reuse:
+            array = np.empty(shape, dtype = dtype)
+        else:
+            size = int(np.prod(shape))
+            buffer = self.buffers.get(name)
+            if buffer is None or buffer.size < size or buffer.dtype != np.dtype(dtype):
+                buffer = self.buffers[name] = np.empty(size, dtype = dtype)
+            array = buffer[:size].reshape(shape)
+        if fill is not None:
+            array.fill(fill)
+        return array
+
+    def nearest_neighbors(self, k, block_size = 1 << 22):
+        '''
+        private methods, used in the input_data, don't use it outside.
+        Return the k nearest neighbors of each city sorted by the distance.
+        In the lean mode, they are searched by the KD-tree of scipy,
+        or block by block from city_pos if scipy is not installed.
+        Return format: NDArray(n*k)
+        '''
+        if self.lean and cKDTree is not None:
+            # the nearest one is the city itself.
+            return cKDTree(self.city_pos).query(self.city_pos, k + 1)[1][:, 1:]
+        if not self.lean:
+            return self.nearest_neighbors_block(self.distance_table, k)
+        neighbor = np.empty((self.city_count, k), dtype = int)
+        step = max(1, block_size // self.city_count)
+        for start in range(0, self.city_count, step):
+            end = min(start + step, self.city_count)
+            rows = np.arange(start, end)
+            distance = self.edge_distance(rows[:, None], np.arange(self.city_count)[None, :])
+            distance[rows - start, rows] = np.inf
+            neighbor[start:end] = self.nearest_neighbors_block(distance, k)
+        return neighbor
+
+    @staticmethod
+    def nearest_neighbors_block(distance, k):
+        '''
+        private methods, used in the nearest_neighbors, don't use it outside.
+        Return the k columns with the smallest distance of each row, sorted by the distance.
+        '''
+        rows = np.arange(len(distance))[:, None]
+        # the diagonal of the distance_table is a huge number,
+        # so a city is never the neighbor of itself.
+        neighbor = np.argpartition(distance, k - 1, axis = 1)[:, :k]
+        order = np.argsort(distance[rows, neighbor], axis = 1)
+        return neighbor[rows, order]
+
+    def edge_distance(self, city_from, city_to):
+        '''
+        Return the distances of the edges (city_from, city_to), the indices can be NDArray.
+        In the lean mode, they are computed from city_pos on demand.
+        '''
+        if not self.lean:
+            return self.distance_table[city_from, city_to]
+        diff = self.city_pos[city_from] - self.city_pos[city_to]
+        return np.hypot(diff[..., 0], diff[..., 1])
+
+    def neighbor_slot(self, city_from, city_to):
+        '''
+        private methods, used in the lean mode, don't use it outside.
+        Return the flat indices of the edges in the neighbor tables,
+        and the mask of the edges which are in the neighbor lists.
+        '''
+        edge_key = city_from * self.city_count + city_to
+        position = np.searchsorted(self.neighbor_key, edge_key)
+        position[position == len(self.neighbor_key)] = 0
+        inside = self.neighbor_key[position] == edge_key
+        return self.neighbor_order[position], inside
+
+    def fallback_rate(self):
+        '''
+        Return the fraction of the construction steps in which all the candidates
+        in the neighbor list were visited and the best city outside the list was chosen,
+        in the iterations which actually ran.
+        '''
+        iter_count = getattr(self, "iter_count", self.MAX_iter)
+        return self.fallback_count[:iter_count].sum() / (iter_count * self.ant_count * (self.city_count - 1))
+
+    def select_initial_city(self, candidate):
+        '''
+        private methods, used in the iterations, don't use it outside.
+        Fill the first column of candidate with the initial cities of the ants.
+        '''
+        if self.ant_count <= self.city_count:
+            candidate[:, 0] = self.rng.permutation(self.city_count)[:self.ant_count]
+        else:
+            m = self.ant_count
+            n = 1
+            while m > self.city_count:
+                candidate[self.city_count*(n-1):self.city_count*n, 0] = self.rng.permutation(self.city_count)[:]
+                m -= self.city_count
+                n += 1
+            candidate[self.city_count*(n-1):self.ant_count, 0] = self.rng.permutation(self.city_count)[:m]
+
+    def ant_rand(self, now_iter, start, end):
+        '''
+        private methods, used in the iterations, don't use it outside.
+        Return the uniform random numbers of the ants [start, end) in the iteration now_iter,
+        NDArray((end - start)*n), the number of the ant i in the step j is [i - start, j].
+        Each chunk of chunk_size ants in each iteration has its own stream spawned from the seed,
+        so the numbers of an ant don't depend on how the ants are distributed.
+        '''
+        first = start // self.chunk_size
+        last = -(-end // self.chunk_size)
+        rand = np.concatenate([
+            np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key = (1, now_iter, chunk)))
+            .random((self.chunk_size, self.city_count))
+            for chunk in range(first, last)])
+        offset = first * self.chunk_size
+        return rand[start - offset:end - offset]
+
+    def choice_weight(self, pheromone, heuristic, out = None):
+        '''
+        private methods, used in the path construction, don't use it outside.
+        Return the choice weights pheromone^alpha * heuristic, written into out if it is given.
+        '''
+        if self.alpha == 1:
+            return np.multiply(pheromone, heuristic, out = out)
+        out = np.power(pheromone, self.alpha, out = out)
+        out *= heuristic
+        return out
+
+    def update_choice_info(self):
+        '''
+        private methods, used in the iterations, don't use it outside.
+        Refresh the choice_table pheromone^alpha * reciprocal_dist^beta in place,
+        the reciprocal_dist^beta part is the heuristic computed in input_data.
+        The choice_table is NDArray(n*n), or NDArray(n*k) of the neighbor lists.
+        If the pheromone update marked the dirty_edges, only their entries are refreshed,
+        or only their rows with the neighbor lists of the distance_table.
+        '''
+        neighbor = self.lean or self.neighbor_count > 0
+        if self.choice_table is None:
+            shape = (self.city_count, self.neighbor_list.shape[1] if neighbor else self.city_count)
+            self.choice_table = self.allocate("choice", shape, np.float64)
+            self.dirty_edges = None
+        if self.dirty_edges is None:
+            if self.lean:
+                self.choice_weight(self.neighbor_pheromone, self.neighbor_heuristic, self.choice_table)
+            elif neighbor:
+                rows = np.arange(self.city_count)[:, None]
+                self.choice_weight(self.pheromone_table[rows, self.neighbor_list], self.neighbor_heuristic,
+                                   self.choice_table)
+            else:
+                self.choice_weight(self.pheromone_table, self.heuristic, self.choice_table)
+        elif self.dirty_edges:
+            edge = np.concatenate(self.dirty_edges)
+            if neighbor and not self.lean:
+                rows = np.unique(edge // self.city_count)
+                self.choice_table[rows] = self.choice_weight(self.pheromone_table[rows[:, None], self.neighbor_list[rows]],
+                                                             self.neighbor_heuristic[rows])
+            else:
+                heuristic = self.neighbor_heuristic if self.lean else self.heuristic
+                self.choice_table.reshape(-1)[edge] = self.choice_weight(self.pheromone_store().reshape(-1)[edge],
+                                                                         heuristic.reshape(-1)[edge])
+        self.dirty_edges = []
+
+    def select_city(self, weight, rand):
+        '''
+        private methods, used in the path construction, don't use it outside.
+        The pseudo-random proportional rule: if rand < exploit, select the city with
+        the max choice weight, otherwise the roulette wheel selection with the rand rescaled
+        to [0, 1), so one random number decides both.
+        '''
+        if self.exploit <= 0:
+            return roulette_select(weight, rand)
+        selected = weight.argmax(axis = 1)
+        explore = rand >= self.exploit
+        if explore.any():
+            selected[explore] = roulette_select(weight[explore], (rand[explore] - self.exploit) / (1 - self.exploit))
+        return selected
+
+    def batch_select_path(self, candidate, rand):
+        '''
+        private methods, used in the batch_iteration, don't use it outside.
+        Move all the ants forward together, the initial cities should be
+        filled in the first column of candidate, and the choice_table should be updated.
+        The random number of the ant i in the step j is rand[i, j].
+        Return the length of the paths, and the number of the fallback steps
+        when the neighbor lists are used.
+        '''
+        if self.backend == "numba" and not self.lean:
+            length = np.zeros(len(candidate))
+            distance = np.asarray(self.distance_table)
+            if self.neighbor_count > 0:
+                fallback = numba_kernels.batch_select_path_neighbor(
+                    self.choice_table, self.neighbor_list, self.pheromone_table, self.heuristic,
+                    float(self.alpha), distance, candidate, rand, float(self.exploit), length)
+                return length, fallback
+            numba_kernels.batch_select_path(self.choice_table, distance, candidate, rand, float(self.exploit), length)
+            return length, 0
+        if self.neighbor_count > 0:
+            return self.batch_select_path_neighbor(candidate, rand)
+        ant_count = len(candidate)
+        ants = np.arange(ant_count)
+        choice = self.choice_table
+        visited = np.zeros((ant_count, self.city_count), dtype = bool)
+        visit = candidate[:, 0]
+        visited[ants, visit] = True
+        length = np.zeros(ant_count)
+        for j in range(1, self.city_count):
+            # the choice weights of the unvisit cities.
+            weight = choice[visit]
+            weight[visited] = 0
+            # roulette wheel selection
+            k = self.select_city(weight, rand[:, j])
+
+            candidate[:, j] = k
+            visited[ants, k] = True
+            length += self.distance_table[visit, k]
+            visit = k
+        length += self.distance_table[visit, candidate[:, 0]]
+        return length, 0
+
+    def batch_select_path_neighbor(self, candidate, rand):
+        '''
+        private methods, used in the batch_iteration, don't use it outside.
+        Only the unvisit cities in the neighbor list are scored,
+        if all of them are visited, the unvisit city with the max choice weight is selected.
+        In the lean mode, the edges outside the neighbor lists carry no pheromone,
+        so the nearest unvisit city is selected.
+        '''
+        ant_count = len(candidate)
+        ants = np.arange(ant_count)
+        choice = self.choice_table
+        visited = np.zeros((ant_count, self.city_count), dtype = bool)
+        visit = candidate[:, 0]
+        visited[ants, visit] = True
+        length = np.zeros(ant_count)
+        fallback = 0
+        for j in range(1, self.city_count):
+            neighbor = self.neighbor_list[visit]
+            free = ~visited[ants[:, None], neighbor]
+            weight = choice[visit] * free
+            k = np.empty(ant_count, dtype = int)
+            # roulette wheel selection in the neighbor lists
+            inside = free.any(axis = 1)
+            if inside.all():
+                k[:] = neighbor[ants, self.select_city(weight, rand[:, j])]
+            else:
+                rows = ants[inside]
+                k[rows] = neighbor[rows, self.select_city(weight[rows], rand[rows, j])]
+                # the best unvisit city outside the neighbor lists
+                rows = ants[~inside]
+                if self.lean:
+                    weight = -self.edge_distance(visit[rows][:, None], np.arange(self.city_count)[None, :])
+                else:
+                    weight = self.choice_weight(self.pheromone_table[visit[rows]], self.heuristic[visit[rows]])
+                weight[visited[rows]] = -np.inf
+                k[rows] = weight.argmax(axis = 1)
+                fallback += len(rows)
+
+            candidate[:, j] = k
+            visited[ants, k] = True
+            length += self.edge_distance(visit, k)
+            visit = k
+        length += self.edge_distance(visit, candidate[:, 0])
+        return length, fallback
+
+    def local_search_path(self, candidate, length, ants):
+        '''
+        private methods, used in the iterations, don't use it outside.
+        Improve the paths of the ants in place with the local search, and update their length.
+        '''
+        if self.search_list is None:
+            # the local search reads the neighbor lists as python lists, they are converted once.
+            self.search_list = (self.neighbor_list if self.neighbor_count > 0 else self.search_neighbor).tolist()
+        for i in ants:
+            improve_tour(candidate[i], self.edge_distance, self.search_list, self.local_search)
+            length[i] = self.edge_distance(candidate[i], np.roll(candidate[i], -1)).sum()
+
+    def best_ants(self, length):
+        '''
+        private methods, used in the iterations, don't use it outside.
+        Return the ants with the shortest paths, which are improved by the local search.
+        '''
+        count = min(self.local_search_ants, len(length))
+        return np.argpartition(length, count - 1)[:count]
+
+    def update_best_path(self, now_iter, candidate, length):
+        '''
+        private methods, used in the iterations, don't use it outside.
+        '''
+        if now_iter == 0:
+            self.distance_best[now_iter] = length.min()
+            self.path_best[now_iter] = candidate[length.argmin()].copy()
+        else:
+            if length.min() > self.distance_best[now_iter -1]:
+                self.distance_best[now_iter] = self.distance_best[now_iter -1]
+                self.path_best[now_iter] = self.path_best[now_iter -1].copy()
+            else:
+                self.distance_best[now_iter] = length.min()
+                self.path_best[now_iter] = candidate[length.argmin()].copy()
+
+    def branching_factor(self, lambda_ = 0.05):
+        '''
+        Return the average lambda-branching factor of the pheromone, the average number of
+        the edges of a city whose pheromone >= min + lambda_ * (max - min) of the city.
+        In the lean mode, only the edges in the neighbor lists are counted.
+        With the mmas method, the range of each city is [tau_min, tau_max] instead,
+        because all the edges start at tau_max and only the best path deposits.
+        '''
+        table = self.neighbor_pheromone if self.lean else self.pheromone_table
+        if getattr(self, "tau_range", None) is not None:
+            low, high = self.tau_range
+        else:
+            low = table.min(axis = 1, keepdims = True)
+            high = table.max(axis = 1, keepdims = True)
+        return (table >= low + lambda_ * (high - low)).sum(axis = 1).mean()
+
+    def check_stop(self, now_iter, start_time):
+        '''
+        private methods, used in the iterations, don't use it outside.
+        Return the reason to stop after the iteration now_iter, or None to continue.
+        '''
+        if self.target_length is not None and self.distance_best[now_iter] <= self.target_length:
+            return "target_length"
+        if self.stagnation_window is not None and now_iter >= self.stagnation_window and \
+                self.distance_best[now_iter] >= self.distance_best[now_iter - self.stagnation_window]:
+            return "stagnation"
+        if self.time_budget is not None and time.perf_counter() - start_time >= self.time_budget:
+            return "time_budget"
+        # the acs pheromone never falls below tau0, so the branching factor is about 1
+        # from the first iteration, the condition is not used with the acs method.
+        if self.branching_threshold is not None and self.method != "acs" and \
+                self.branching_factor() <= self.branching_threshold:
+            return "branching_factor"
+        if now_iter + 1 >= self.MAX_iter:
+            return "max_iter"
+        return None
+
+    def record_phase(self, phase, now_iter, tick):
+        '''
+        private methods, used in the iterations, don't use it outside.
+        Record the time from tick to now as the wall time of the phase, and return now.
+        '''
+        now = time.perf_counter()
+        self.phase_time[phase][now_iter] = now - tick
+        return now
+
+    def phase_summary(self):
+        '''
+        Return the total wall time of each phase in the iterations which actually ran.
+        '''
+        iter_count = getattr(self, "iter_count", self.MAX_iter)
+        return {phase: float(self.phase_time[phase][:iter_count].sum()) for phase in PHASES}
+
+    def iteration_stats(self, name, now_iter, start_time, length, stop_reason):
+        '''
+        private methods, used in the iterations, don't use it outside.
+        Return the stats of the iteration now_iter passed to the observers.
+        '''
+        table = self.neighbor_pheromone if self.lean else self.pheromone_table
+        return dict(name = name, iteration = now_iter, elapsed = time.perf_counter() - start_time,
+                    phase_time = {phase: float(self.phase_time[phase][now_iter]) for phase in PHASES},
+                    distance_best = float(self.distance_best[now_iter]),
+                    length_mean = float(length.mean()), length_std = float(length.std()),
+                    pheromone_min = float(table.min()), pheromone_max = float(table.max()),
+                    fallback_count = int(self.fallback_count[now_iter]),
+                    peak_memory_mb = telemetry.peak_memory()[0], stop_reason = stop_reason)
+
+    def next_checkpoint_interval(self, start_iter, now_iter):
+        '''
+        private methods, used in the iterations, don't use it outside.
+        Return the number of the iterations until the next checkpoint.
+        '''
+        if self.checkpoint_interval != "auto":
+            return self.checkpoint_interval
+        checkpoint_time = self.phase_time["checkpoint"][now_iter]
+        iter_time = sum(self.phase_time[phase][start_iter:now_iter + 1].sum()
+                        for phase in PHASES if phase != "checkpoint") / (now_iter + 1 - start_iter)
+        # the checkpoint time is spread over the iterations between the checkpoints.
+        return max(1, int(np.ceil(checkpoint_time / (0.01 * iter_time)))) if iter_time > 0 else 1
+
+    def save_checkpoint(self, path, name, method, now_iter):
+        '''
+        Save the state after the iteration now_iter into the .npz file path, including
+        the pheromone, the best paths, the random state and the parameters.
+        The file is replaced atomically, so a broken checkpoint is never loaded.
+        '''
+        state = dict(name = name, method = method, iteration = now_iter,
+                     params = self.get_params(), rng_state = self.rng.bit_generator.state,
+                     tau0 = self.tau0, reinit_iter = self.reinit_iter)
+        temp_path = path + "." + str(os.getpid()) + ".tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(f, state = np.array(json.dumps(state)),
+                     pheromone = self.neighbor_pheromone if self.lean else self.pheromone_table,
+                     path_best = self.path_best[:now_iter + 1], distance_best = self.distance_best[:now_iter + 1],
+                     fallback_count = self.fallback_count[:now_iter + 1],
+                     **{"phase_" + phase: self.phase_time[phase][:now_iter + 1] for phase in PHASES})
+        os.replace(temp_path, path)
+
+    def load_checkpoint(self, path):
+        '''
+        Load the state saved by save_checkpoint, the data should be input already.
+        The next iteration continues after the saved iteration.
+        Return the name of the iteration and the pheromone method of the checkpoint.
+        '''
+        with np.load(path) as checkpoint:
+            state = json.loads(str(checkpoint["state"]))
+            iter_count = state["iteration"] + 1
+            if iter_count >= self.MAX_iter:
+                raise ValueError("ACO checkpoint has already reached MAX_iter!")
+            pheromone = self.neighbor_pheromone if self.lean else self.pheromone_table
+            if pheromone.shape != checkpoint["pheromone"].shape:
+                raise ValueError("ACO checkpoint does not match the input data!")
+            pheromone[...] = checkpoint["pheromone"]
+            self.path_best[:iter_count] = checkpoint["path_best"]
+            self.distance_best[:iter_count] = checkpoint["distance_best"]
+            self.fallback_count[:iter_count] = checkpoint["fallback_count"]
+            for phase in PHASES:
+                self.phase_time[phase][:iter_count] = checkpoint["phase_" + phase]
+        self.rng.bit_generator.state = state["rng_state"]
+        self.dirty_edges = None
+        self.tau0 = state["tau0"]
+        self.reinit_iter = state["reinit_iter"]
+        self.start_iter = iter_count
+        return state["name"], state["method"]
+
+    @classmethod
+    def resume(cls, checkpoint_path, city_pos, distance_table = None, **params):
+        '''
+        Build the ACO from the checkpoint, and continue its iteration from the saved iteration,
+        the same seed gives the same paths as the iteration which was not interrupted.
+        city_pos, distance_table: the same data as the interrupted iteration.
+        params: the parameters replacing the saved ones, e.g. MAX_iter to run more iterations,
+                or the observers.
+        Return the same as the iteration.
+        '''
+        with np.load(checkpoint_path) as checkpoint:
+            state = json.loads(str(checkpoint["state"]))
+        state["params"].update(checkpoint_path = checkpoint_path)
+        state["params"].update(params)
+        aco = cls(**state["params"])
+        aco.input_data(city_pos, distance_table)
+        name, method = aco.load_checkpoint(checkpoint_path)
+        return getattr(aco, name + "_iteration")(method)
+
+    def finish_iteration(self, iter_count, stop_reason):
+        '''
+        private methods, used in the iterations, don't use it outside.
+        Return the path_best and distance_best of the iterations which actually ran, and the stop reason.
+        '''
+        self.iter_count = iter_count
+        self.stop_reason = stop_reason
+        return self.path_best[:iter_count], self.distance_best[:iter_count], stop_reason
+
+    def update_pheromone(self, candidate, length, method, now_iter = 0):
+        '''
+        private methods, used in the iterations, don't use it outside.
+        The pheromone update shared by all the iterations,
+        the deposits of all the edges in the paths are accumulated at once,
+        and the pheromone_table is updated in place.
+        '''
+        if method == "mmas":
+            self.update_pheromone_mmas(now_iter, candidate, length)
+            return
+        if method == "acs":
+            self.update_pheromone_acs(now_iter, candidate, length)
+            return
+        # all the pheromone is evaporated.
+        self.dirty_edges = None
+        # the edges (i, j) of the paths, including the edge back to the initial city.
+        city_from = candidate
+        city_to = np.roll(candidate, -1, axis = 1)
+        if method == "quantity":
+            incre_pheromone = self.Q / self.edge_distance(city_from, city_to)
+        elif method == "density":
+            incre_pheromone = np.full(candidate.shape, float(self.Q))
+        elif method == "cycle":
+            incre_pheromone = np.broadcast_to((self.Q / length)[:, None], candidate.shape)
+        elif method == "constant":
+            incre_pheromone = self.edge_distance(city_from, city_to) * (self.Q / length)[:, None]
+        else:
+            raise ValueError("ACO method does not support!")
+        if self.lean:
+            # only the edges in the neighbor lists store the pheromone.
+            slot, inside = self.neighbor_slot(city_from.ravel(), city_to.ravel())
+            self.neighbor_pheromone *= 1 - self.rho
+            np.add.at(self.neighbor_pheromone.reshape(-1), slot[inside], incre_pheromone.ravel()[inside])
+            return
+        self.pheromone_table *= 1 - self.rho
+        if self.backend == "numba":
+            numba_kernels.deposit_pheromone(self.pheromone_table, candidate,
+                                            np.ascontiguousarray(incre_pheromone, dtype = self.pheromone_table.dtype))
+            return
+        np.add.at(self.pheromone_table.reshape(-1), (city_from * self.city_count + city_to).ravel(),
+                  incre_pheromone.ravel())
+
+    def deposit_path(self, path, amount):
+        '''
+        Add amount of pheromone to the edges of the path without the evaporation,
+        e.g. for the best path received from the other colonies.
+        path: NDArray(n), the cities of the path.
+        '''
+        city_from = np.asarray(path)
+        index, inside = self.edge_index(city_from, np.roll(city_from, -1))
+        self.pheromone_store().reshape(-1)[index[inside]] += amount
+        if self.dirty_edges is not None:
+            self.dirty_edges.append(index[inside])
+
+    def pheromone_store(self):
+        '''
+        Return the table storing the pheromone, the neighbor_pheromone in the lean mode.
+        '''
+        return self.neighbor_pheromone if self.lean else self.pheromone_table
+
+    def edge_index(self, city_from, city_to):
+        '''
+        private methods, used in the pheromone update, don't use it outside.
+        Return the flat indices of the edges in the pheromone_store,
+        and the mask of the edges which are stored.
+        '''
+        if self.lean:
+            return self.neighbor_slot(city_from, city_to)
+        return city_from * self.city_count + city_to, np.ones(np.shape(city_from), dtype = bool)
+
+    def prepare_method(self, method):
+        '''
+        private methods, used in the iterations, don't use it outside.
+        Check the pheromone method, and select the construction rule of it.
+        '''
+        if method not in ("quantity", "density", "cycle", "constant", "mmas", "acs"):
+            raise ValueError("ACO method does not support!")
+        self.method = method
+        self.exploit = self.q0 if method == "acs" else 0.0
+        # [tau_min, tau_max] of the mmas method, set by its pheromone update.
+        self.tau_range = None
+
+    def update_pheromone_mmas(self, now_iter, candidate, length):
+        '''
+        private methods, used in the pheromone update, don't use it outside.
+        MAX-MIN Ant System: only the iteration best path or the best path so far deposits,
+        and the pheromone is kept in [tau_min, tau_max], tau_max = Q / (rho * best distance).
+        The pheromone is set to tau_max in the first iteration, and when the best distance
+        is not improved in reinit_window iterations.
+        '''
+        if self.best_deposit == "iteration":
+            path, distance = candidate[length.argmin()], length.min()
+        else:
+            path, distance = self.path_best[now_iter], self.distance_best[now_iter]
+        tau_max = self.Q / (self.rho * self.distance_best[now_iter])
+        root = self.p_best ** (1.0 / self.city_count)
+        tau_min = tau_max * (1 - root) / ((self.city_count / 2 - 1) * root)
+        pheromone = self.pheromone_store()
+        # all the pheromone is evaporated.
+        self.dirty_edges = None
+        if now_iter == 0 or (self.reinit_window is not None and now_iter - self.reinit_iter >= self.reinit_window and
+                             self.distance_best[now_iter] >= self.distance_best[now_iter - self.reinit_window]):
+            pheromone[...] = tau_max
+            self.reinit_iter = now_iter
+        pheromone *= 1 - self.rho
+        self.deposit_path(path, self.Q / distance)
+        np.clip(pheromone, min(tau_min, tau_max), tau_max, out = pheromone)
+        self.tau_range = (min(tau_min, tau_max), tau_max)
+
+    def update_pheromone_acs(self, now_iter, candidate, length):
+        '''
+        private methods, used in the pheromone update, don't use it outside.
+        Ant Colony System: the edges passed by the ants are evaporated towards tau0
+        by the local update, tau = (1 - xi) * tau + xi * tau0 for each pass, then only the edges
+        of the best path so far are updated, tau = (1 - rho) * tau + rho * Q / best distance.
+        The local update is applied after all the ants constructed their paths,
+        so the paths don't depend on the order of the ants.
+        tau0 = Q / (n * the best distance of the first iteration).
+        '''
+        pheromone = self.pheromone_store().reshape(-1)
+        if now_iter == 0:
+            self.tau0 = self.Q / (self.city_count * self.distance_best[0])
+            pheromone[...] = self.tau0
+            self.dirty_edges = None
+        index, inside = self.edge_index(candidate, np.roll(candidate, -1, axis = 1))
+        edge, count = np.unique(index[inside], return_counts = True)
+        keep = (1 - self.xi) ** count
+        pheromone[edge] = keep * pheromone[edge] + (1 - keep) * self.tau0
+        path = self.path_best[now_iter]
+        index, inside = self.edge_index(path, np.roll(path, -1))
+        best_edge = index[inside]
+        pheromone[best_edge] = (1 - self.rho) * pheromone[best_edge] + self.rho * self.Q / self.distance_best[now_iter]
+        # only the passed edges are changed, the choice_table refreshes them only.
+        if self.dirty_edges is not None:
+            self.dirty_edges += [edge, best_edge]
+
+    def iterate(self, name, method, candidate, select_path, local_search_path):
+        '''
+        private methods, used in the iterations, don't use it outside.
+        The iteration loop shared by all the iterations.
+        select_path(now_iter): construct the paths in candidate and return their length.
+        local_search_path(candidate, length, ants): improve the paths of the ants in place.
+        '''
+        observers = list(self.observers)
+        if self.show_progress:
+            observers.append(telemetry.ProgressSink(self.MAX_iter - self.start_iter, name))
+        start_time = time.perf_counter()
+        start_iter, self.start_iter = self.start_iter, 0
+        next_checkpoint = start_iter
+        for now_iter in range(start_iter, self.MAX_iter):
+            tick = time.perf_counter()
+            # select the initial city
+            self.select_initial_city(candidate)
+            tick = self.record_phase("initial_city", now_iter, tick)
+
+            # select the path
+            length = select_path(now_iter)
+            tick = self.record_phase("construction", now_iter, tick)
+
+            # improve the best paths
+            if self.local_search is not None:
+                local_search_path(candidate, length, self.best_ants(length))
+            tick = self.record_phase("local_search", now_iter, tick)
+
+            # update the best path
+            self.update_best_path(now_iter, candidate, length)
+            tick = self.record_phase("best_path", now_iter, tick)
+
+            # update the pheromone
+            self.update_pheromone(candidate, length, method, now_iter)
+            tick = self.record_phase("pheromone", now_iter, tick)
+
+            # check the convergence
+            stop_reason = self.check_stop(now_iter, start_time)
+            tick = self.record_phase("convergence", now_iter, tick)
+
+            # save the checkpoint
+            if self.checkpoint_path is not None and stop_reason is None and now_iter >= next_checkpoint:
+                self.save_checkpoint(self.checkpoint_path, name, method, now_iter)
+                self.record_phase("checkpoint", now_iter, tick)
+                next_checkpoint = now_iter + self.next_checkpoint_interval(start_iter, now_iter)
+            if observers:
+                stats = self.iteration_stats(name, now_iter, start_time, length, stop_reason)
+                for observer in observers:
+                    observer(stats)
+            if stop_reason is not None:
+                break
+
+        return self.finish_iteration(now_iter + 1, stop_reason)
 
     def serial_iteration(self, method = "cycle"):
         '''
         The main body of the aco.
         It will excute serially.
+        If neighbor_count > 0, only the nearest neighbor candidate lists are scored,
+        use fallback_rate() to get how often the candidates were exhausted.
         the method can be choosed in the following list:
 
         "density": incre_pheromone = Q
@@ -51,130 +938,108 @@ class ACO:
 
         "constant": incre_pheromone = dist(i,j) * Q / L(k)
 
+        "mmas": MAX-MIN Ant System, only the best path deposits, and tau is kept in [tau_min, tau_max]
+
+        "acs": Ant Colony System, the pseudo-random proportional rule with q0,
+               the local update of the passed edges and the global update of the best path
+
         Return the path_best list combined by the best path in each iteration,
-        and the distance_best list combinde by the shortest distance according to the best path in each iteration.
+        and the distance_best list combinde by the shortest distance according to the best path in each iteration,
+        both only include the iterations which actually ran,
+        and the stop reason: "max_iter", "stagnation", "target_length", "time_budget" or "branching_factor".
+        The wall time of each phase of each iteration is recorded in phase_time.
         '''
+        if self.lean:
+            raise ValueError("ACO serial_iteration needs the distance_table!")
+        self.prepare_method(method)
         candidate = np.zeros((self.ant_count, self.city_count), dtype = int)
-        print("ACO serial iteration progress:")
-        for now_iter in tqdm(range(self.MAX_iter)):
-            # select the initial city
-            if self.ant_count <= self.city_count:
-                candidate[:, 0] = np.random.permutation(range(self.city_count))[:self.ant_count]
-            else:
-                m = self.ant_count
-                n = 1
-                while m > self.city_count:
-                    candidate[self.city_count*(n-1):self.city_count*n, 0] = np.random.permutation(range(self.city_count))[:]
-                    m -= self.city_count
-                    n += 1
-                candidate[self.city_count*(n-1):self.ant_count, 0] = np.random.permutation(range(self.city_count))[:m]
+
+        def select_path(now_iter):
             length = np.zeros(self.ant_count)
-            
-            # select the path
+            self.update_choice_info()
+            rand = self.ant_rand(now_iter, 0, self.ant_count)
+            fallback = 0
             for i in range(self.ant_count):
                 # remove the initial city
-                unvisit = list(range(self.city_count))
+                visited = np.zeros(self.city_count, dtype = bool)
                 visit = candidate[i, 0]
-                unvisit.remove(visit)
+                visited[visit] = True
                 for j in range(1, self.city_count):
-                    # compute the probabilities of transfer to unvisit cities.
-                    probability_trans = np.zeros(len(unvisit))
-                    for k in range(len(unvisit)):
-                        probability_trans[k] = np.power(self.pheromone_table[visit][unvisit[k]], self.alpha) * \
-                                               np.power(self.reciprocal_dist[visit][unvisit[k]], self.beta)
-                    # roulette wheel selection
-                    cumsum_prob_trans = (probability_trans / sum(probability_trans)).cumsum()
-                    cumsum_prob_trans -= np.random.rand()
-                    k = unvisit[list(cumsum_prob_trans > 0).index(True)]
+                    if self.neighbor_count > 0:
+                        # only the unvisit cities in the neighbor list are scored.
+                        neighbor = self.neighbor_list[visit]
+                        free = ~visited[neighbor]
+                        if free.any():
+                            weight = self.choice_table[visit] * free
+                            k = neighbor[self.select_city(weight[None, :], rand[i:i + 1, j])[0]]
+                        else:
+                            # the best unvisit city outside the neighbor list
+                            weight = self.choice_weight(self.pheromone_table[visit], self.heuristic[visit])
+                            weight[visited] = -np.inf
+                            k = weight.argmax()
+                            fallback += 1
+                    else:
+                        # compute the choice weights of the unvisit cities.
+                        weight = self.choice_table[visit].copy()
+                        weight[visited] = 0
+                        # roulette wheel selection
+                        k = self.select_city(weight[None, :], rand[i:i + 1, j])[0]
 
                     candidate[i, j] = k
-                    unvisit.remove(k)
+                    visited[k] = True
                     length[i] += self.distance_table[visit][k]
                     visit = k
                 length[i] += self.distance_table[visit][candidate[i, 0]]
+            self.fallback_count[now_iter] = fallback
+            return length
 
-            # update the best path
-            if now_iter == 0:
-                self.distance_best[now_iter] = length.min()
-                self.path_best[now_iter] = candidate[length.argmin()].copy()
-            else:
-                if length.min() > self.distance_best[now_iter -1]:
-                    self.distance_best[now_iter] = self.distance_best[now_iter -1]
-                    self.path_best[now_iter] = self.path_best[now_iter -1].copy()
-                else:
-                    self.distance_best[now_iter] = length.min()
-                    self.path_best[now_iter] = candidate[length.argmin()].copy()
-
-            # update the pheromone
-            incre_pheromone = np.zeros((self.city_count, self.city_count))
-            if method == "quantity":
-                for i in range(self.ant_count):
-                    for j in range(self.city_count - 1):
-                        incre_pheromone[candidate[i, j]][candidate[i, j+1]] += \
-                            self.Q / self.distance_table[candidate[i, j]][candidate[i,j + 1]]
-                    incre_pheromone[candidate[i, j+1]][candidate[i, 0]] += \
-                        self.Q / self.distance_table[candidate[i, j+1]][candidate[i, 0]]
-            elif method == "density":
-                for i in range(self.ant_count):
-                    for j in range(self.city_count - 1):
-                        incre_pheromone[candidate[i, j]][candidate[i, j+1]] += self.Q
-                    incre_pheromone[candidate[i, j+1]][candidate[i, 0]] += self.Q
-            elif method == "cycle":
-                for i in range(self.ant_count):
-                    for j in range(self.city_count - 1):
-                        incre_pheromone[candidate[i, j]][candidate[i, j+1]] += self.Q / length[i]
-                    incre_pheromone[candidate[i, j+1]][candidate[i, 0]] += self.Q / length[i]
-            elif method == "constant":
-                for i in range(self.ant_count):
-                    for j in range(self.city_count - 1):
-                        incre_pheromone[candidate[i, j]][candidate[i, j+1]] += \
-                            self.distance_table[candidate[i, j]][candidate[i, j+1]] * self.Q / length[i]
-                    incre_pheromone[candidate[i, j+1]][candidate[i, 0]] += \
-                        self.distance_table[candidate[i, j+1]][candidate[i, 0]] * self.Q / length[i]
-            else:
-                raise ValueError("ACO method does not support!")
-            self.pheromone_table = (1 - self.rho) * self.pheromone_table + incre_pheromone
-        
-        return self.path_best, self.distance_best
+        return self.iterate("serial", method, candidate, select_path, self.local_search_path)
 
-    def select_path(self, i):
-        '''
-        private methods, used in the parallel_iteration, don't use it outside.
+    def batch_iteration(self, method = "cycle"):
         '''
-        # remove the initial city
-        unvisit = list(range(self.city_count))
-        visit = candidate[i * self.city_count + 0]
-        unvisit.remove(visit)
-        for j in range(1, self.city_count):
-            # compute the probabilities of transfer to unvisit cities.
-            probability_trans = np.zeros(len(unvisit))
-            for k in range(len(unvisit)):
-                probability_trans[k] = np.power(self.pheromone_table[visit][unvisit[k]], self.alpha) * \
-                                        np.power(self.reciprocal_dist[visit][unvisit[k]], self.beta)
-            # roulette wheel selection
-            cumsum_prob_trans = (probability_trans / sum(probability_trans)).cumsum()
-            cumsum_prob_trans -= np.random.rand()
-            k = unvisit[list(cumsum_prob_trans > 0).index(True)]
-            # fill the candidate table
-            candidate[i * self.city_count + j] = k
-            unvisit.remove(k)
-            length[i] += self.distance_table[visit][k]
-            visit = k
-        length[i] += self.distance_table[visit][candidate[i * self.city_count + 0]]
+        The main body of the aco.
+        It will excute serially, but all the ants construct their paths together
+        with the vectorized roulette wheel selection.
+        If neighbor_count > 0, only the nearest neighbor candidate lists are scored,
+        use fallback_rate() to get how often the candidates were exhausted.
+        the method can be choosed in the following list:
 
-    def init_pool_processes(self, the_length, shared_array):
-        '''
-        private methods, used in the parallel_iteration, don't use it outside.
+        "density": incre_pheromone = Q
+
+        "quantity": incre_pheromone = Q / dist(i,j)
+
+        "cycle": incre_pheromone = Q / L(k)
+
+        "constant": incre_pheromone = dist(i,j) * Q / L(k)
+
+        "mmas": MAX-MIN Ant System, only the best path deposits, and tau is kept in [tau_min, tau_max]
+
+        "acs": Ant Colony System, the pseudo-random proportional rule with q0,
+               the local update of the passed edges and the global update of the best path
+
+        Return the path_best list combined by the best path in each iteration,
+        and the distance_best list combinde by the shortest distance according to the best path in each iteration,
+        both only include the iterations which actually ran,
+        and the stop reason: "max_iter", "stagnation", "target_length", "time_budget" or "branching_factor".
+        The wall time of each phase of each iteration is recorded in phase_time.
         '''
-        global length
-        length = the_length
-        global candidate
-        candidate = shared_array
+        self.prepare_method(method)
+        candidate = np.zeros((self.ant_count, self.city_count), dtype = int)
+
+        def select_path(now_iter):
+            self.update_choice_info()
+            rand = self.ant_rand(now_iter, 0, self.ant_count)
+            length, self.fallback_count[now_iter] = self.batch_select_path(candidate, rand)
+            return length
+
+        return self.iterate("batch", method, candidate, select_path, self.local_search_path)
 
     def parallel_iteration(self, method = "cycle"):
         '''
         The main body of the aco.
         It will excute parallelly.
+        The worker processes are started once, the tables are placed in the shared memory,
+        and each task constructs the paths of a chunk of ants.
         the method can be choosed in the following list:
 
         "density": incre_pheromone = Q
@@ -183,78 +1048,74 @@ class ACO:
 
         "cycle": incre_pheromone = Q / L(k)
 
+        "constant": incre_pheromone = dist(i,j) * Q / L(k)
+
+        "mmas": MAX-MIN Ant System, only the best path deposits, and tau is kept in [tau_min, tau_max]
+
+        "acs": Ant Colony System, the pseudo-random proportional rule with q0,
+               the local update of the passed edges and the global update of the best path
+
         Return the path_best list combined by the best path in each iteration,
-        and the distance_best list combinde by the shortest distance according to the best path in each iteration.
-        '''
-        shared_array = Array(ctypes.c_int64, self.ant_count * self.city_count)
-        for i in range(len(shared_array)):
-            shared_array[i] = 0
-        shared_np_array = np.frombuffer(shared_array.get_obj(), dtype=np.int64)
-        candidate = shared_np_array.reshape((self.ant_count, self.city_count))
-        print("ACO parallel iteration progress:")
-        for now_iter in tqdm(range(self.MAX_iter)):
-            # select the initial city
-            if self.ant_count <= self.city_count:
-                candidate[:, 0] = np.random.permutation(range(self.city_count))[:self.ant_count]
-            else:
-                m = self.ant_count
-                n = 1
-                while m > self.city_count:
-                    candidate[self.city_count*(n-1):self.city_count*n, 0] = np.random.permutation(range(self.city_count))[:]
-                    m -= self.city_count
-                    n += 1
-                candidate[self.city_count*(n-1):self.ant_count, 0] = np.random.permutation(range(self.city_count))[:m]
-            
-            length = Array(ctypes.c_double, self.ant_count)
-            for i in range(len(length)):
-                length[i] = 0
-            
-            # select the path
-            p = Pool(processes=self.use_CPUs, initializer=self.init_pool_processes, initargs=(length, shared_array,))
-            p.map(self.select_path, list(range(self.ant_count)))
-            p.close()    
-            p.join()
-            length = np.array(length)
-            # update the best path
-            if now_iter == 0:
-                self.distance_best[now_iter] = length.min()
-                self.path_best[now_iter] = candidate[length.argmin()].copy()
-            else:
-                if length.min() > self.distance_best[now_iter -1]:
-                    self.distance_best[now_iter] = self.distance_best[now_iter -1]
-                    self.path_best[now_iter] = self.path_best[now_iter -1].copy()
-                else:
-                    self.distance_best[now_iter] = length.min()
-                    self.path_best[now_iter] = candidate[length.argmin()].copy()
+        and the distance_best list combinde by the shortest distance according to the best path in each iteration,
+        both only include the iterations which actually ran,
+        and the stop reason: "max_iter", "stagnation", "target_length", "time_budget" or "branching_factor".
+        The wall time of each phase of each iteration is recorded in phase_time.
+        '''
+        self.prepare_method(method)
+        self.update_choice_info()
+        if self.lean:
+            tables = ["city_pos", "neighbor_list", "neighbor_pheromone", "neighbor_heuristic", "choice_table"]
+        else:
+            tables = ["distance_table", "heuristic", "pheromone_table", "choice_table"]
+            if self.neighbor_count > 0:
+                tables.append("neighbor_list")
+        if self.local_search is not None and self.neighbor_count <= 0:
+            tables.append("search_neighbor")
+        arrays = {name: getattr(self, name) for name in tables}
+        arrays["candidate"] = np.zeros((self.ant_count, self.city_count), dtype = int)
+        arrays["length"] = np.zeros(self.ant_count)
+        # the ants are split evenly over the processes, the random numbers of an ant
+        # don't depend on its task, because the streams are keyed by the chunks.
+        task_size = -(-self.ant_count // self.use_CPUs)
+        chunks = [(start, min(start + task_size, self.ant_count))
+                  for start in range(0, self.ant_count, task_size)]
 
-            # update the pheromone
-            incre_pheromone = np.zeros((self.city_count, self.city_count))
-            if method == "quantity":
-                for i in range(self.ant_count):
-                    for j in range(self.city_count - 1):
-                        incre_pheromone[candidate[i, j]][candidate[i, j + 1]] += \
-                            self.Q / self.distance_table[candidate[i, j]][candidate[i,j + 1]]
-                    incre_pheromone[candidate[i, j + 1]][candidate[i, 0]] += \
-                        self.Q / self.distance_table[candidate[i, j + 1]][candidate[i, 0]]
-            elif method == "density":
-                for i in range(self.ant_count):
-                    for j in range(self.city_count - 1):
-                        incre_pheromone[candidate[i, j]][candidate[i, j + 1]] += self.Q
-                    incre_pheromone[candidate[i, j + 1]][candidate[i, 0]] += self.Q
-            elif method == "cycle":
-                for i in range(self.ant_count):
-                    for j in range(self.city_count - 1):
-                        incre_pheromone[candidate[i, j]][candidate[i, j + 1]] += self.Q / length[i]
-                    incre_pheromone[candidate[i, j + 1]][candidate[i, 0]] += self.Q / length[i]
-            elif method == "constant":
-                for i in range(self.ant_count):
-                    for j in range(self.city_count - 1):
-                        incre_pheromone[candidate[i, j]][candidate[i, j+1]] += \
-                            self.distance_table[candidate[i, j]][candidate[i, j+1]] * self.Q / length[i]
-                    incre_pheromone[candidate[i, j+1]][candidate[i, 0]] += \
-                        self.distance_table[candidate[i, j+1]][candidate[i, 0]] * self.Q / length[i]
-            else:
-                raise ValueError("ACO method does not support!")
-            self.pheromone_table = (1 - self.rho) * self.pheromone_table + incre_pheromone
-        
-        return self.path_best, self.distance_best
+        blocks = []
+        specs = {}
+        try:
+            for name, array in arrays.items():
+                block, view, specs[name] = create_shared_array(array)
+                blocks.append(block)
+                arrays[name] = view
+                if name in tables:
+                    # the pheromone updates are visible to the workers.
+                    setattr(self, name, view)
+            candidate = arrays["candidate"]
+            length = arrays["length"]
+            context = numba_kernels.pool_context(self.backend)
+            with context.Pool(processes = self.use_CPUs, initializer = init_shared_worker,
+                              initargs = (self.get_params(), dict(city_count = self.city_count, lean = self.lean,
+                                                                        exploit = self.exploit, search_list = None),
+                                          specs)) as p:
+
+                def select_path(now_iter):
+                    self.update_choice_info()
+                    self.fallback_count[now_iter] = sum(p.map(shared_select_path,
+                                                              [(now_iter, start, end) for start, end in chunks]))
+                    return length
+
+                def local_search_path(candidate, length, ants):
+                    # each task improves one ant.
+                    p.map(shared_local_search, ants)
+
+                result = self.iterate("parallel", method, candidate, select_path, local_search_path)
+        finally:
+            # move the tables out of the shared memory before releasing it.
+            for name in tables:
+                setattr(self, name, np.array(getattr(self, name)))
+            arrays = candidate = length = None
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        return result
@@ -0,0 +1,166 @@
+from collections import deque
+
+def reverse_segment(tour, pos, start, end):
+    '''
+    Reverse the cyclic segment tour[start..end] in place and update pos.
+    The shorter one of the segment and its complement is reversed,
+    both give the same cycle.
+    '''
+    n = len(tour)
+    length = (end - start) % n + 1
+    if 2 * length > n:
+        start, end = (end + 1) % n, (start - 1) % n
+        length = n - length
+    for _ in range(length // 2):
+        a = tour[start]
+        b = tour[end]
+        tour[start] = b
+        pos[b] = start
+        tour[end] = a
+        pos[a] = end
+        start = (start + 1) % n
+        end = (end - 1) % n
+
+def two_opt(tour, distance, neighbor_list):
+    '''
+    2-opt local search with the neighbor lists and the don't look bits.
+    tour: list of the cities, it will be improved in place.
+    distance: function(i, j) returning the distance of the edge (i, j).
+    neighbor_list: list of the nearest neighbors of each city, sorted by the distance.
+    Return the decrease of the tour length.
+    '''
+    n = len(tour)
+    pos = [0] * n
+    for i, city in enumerate(tour):
+        pos[city] = i
+    # the cities in the queue have their don't look bits off.
+    queue = deque(tour)
+    active = [True] * n
+    total_gain = 0.0
+    while queue:
+        a = queue.popleft()
+        active[a] = False
+        improved = False
+        for step in (1, -1):
+            i = pos[a]
+            b = tour[(i + step) % n]
+            d_ab = distance(a, b)
+            for c in neighbor_list[a]:
+                d_ac = distance(a, c)
+                if d_ac >= d_ab:
+                    break
+                j = pos[c]
+                d = tour[(j + step) % n]
+                if c == b or d == a:
+                    continue
+                gain = d_ab + distance(c, d) - d_ac - distance(b, d)
+                if gain > 1e-10:
+                    # replace the edges (a, b), (c, d) with (a, c), (b, d).
+                    if step == 1:
+                        reverse_segment(tour, pos, (i + 1) % n, j)
+                    else:
+                        reverse_segment(tour, pos, i, (j - 1) % n)
+                    total_gain += gain
+                    for city in (a, b, c, d):
+                        if not active[city]:
+                            active[city] = True
+                            queue.append(city)
+                    improved = True
+                    break
+            if improved:
+                break
+    return total_gain
+
+def or_opt(tour, distance, neighbor_list, segment_max = 3):
+    '''
+    Or-opt local search with the neighbor lists and the don't look bits,
+    the segments of 1 to segment_max cities are moved to a better place,
+    they may be reversed.
+    tour: list of the cities, it will be improved in place.
+    distance: function(i, j) returning the distance of the edge (i, j).
+    neighbor_list: list of the nearest neighbors of each city, sorted by the distance.
+    Return the decrease of the tour length.
+    '''
+    n = len(tour)
+    pos = [0] * n
+    for i, city in enumerate(tour):
+        pos[city] = i
+    queue = deque(tour)
+    active = [True] * n
+    total_gain = 0.0
+    while queue:
+        a = queue.popleft()
+        active[a] = False
+        move = None
+        for segment_len in range(1, min(segment_max, n - 3) + 1):
+            i = pos[a]
+            segment = [tour[(i + s) % n] for s in range(segment_len)]
+            first, last = segment[0], segment[-1]
+            prev = tour[(i - 1) % n]
+            after = tour[(i + segment_len) % n]
+            remove_gain = distance(prev, first) + distance(last, after) - distance(prev, after)
+            if remove_gain <= 1e-10:
+                continue
+            # the segment end "end" is linked to its neighbor c at the new place.
+            for end, other in ((first, last), (last, first)):
+                for c in neighbor_list[end]:
+                    d_end_c = distance(end, c)
+                    if d_end_c >= remove_gain:
+                        break
+                    if c in segment:
+                        continue
+                    for e in (tour[(pos[c] + 1) % n], tour[(pos[c] - 1) % n]):
+                        if e in segment:
+                            continue
+                        gain = remove_gain - (d_end_c + distance(other, e) - distance(c, e))
+                        if gain > 1e-10:
+                            move = (segment, end, c, e, gain, prev, after)
+                            break
+                    if move is not None:
+                        break
+                if move is not None:
+                    break
+            if move is not None:
+                break
+        if move is None:
+            continue
+        segment, end, c, e, gain, prev, after = move
+        # remove the segment, then insert it between c and e with end next to c.
+        i = pos[segment[0]]
+        rest = [tour[(i + len(segment) + s) % n] for s in range(n - len(segment))]
+        at = rest.index(c)
+        if rest[(at + 1) % len(rest)] == e:
+            inserted = segment if end == segment[0] else segment[::-1]
+            rest[at + 1:at + 1] = inserted
+        else:
+            inserted = segment[::-1] if end == segment[0] else segment
+            rest[at:at] = inserted
+        tour[:] = rest
+        for i, city in enumerate(tour):
+            pos[city] = i
+        total_gain += gain
+        for city in segment + [prev, after, c, e]:
+            if not active[city]:
+                active[city] = True
+                queue.append(city)
+    return total_gain
+
+def improve_tour(tour, distance, neighbor_list, method = "2-opt"):
+    '''
+    Improve the tour in place with the local search method, which can be
+    "2-opt", "or-opt" or "2-opt+or-opt" (2-opt first, then or-opt).
+    tour: NDArray(n) or list of the cities.
+    Return the decrease of the tour length.
+    '''
+    path = [int(city) for city in tour]
+    if method == "2-opt":
+        gain = two_opt(path, distance, neighbor_list)
+    elif method == "or-opt":
+        gain = or_opt(path, distance, neighbor_list)
+    elif method == "2-opt+or-opt":
+        gain = two_opt(path, distance, neighbor_list)
+        gain += or_opt(path, distance, neighbor_list)
+    else:
+        raise ValueError("Local search method does not support!")
+    tour[:] = path
+    return gain
@@ -0,0 +1,207 @@
+'''
+The island model of the ACO: several independent colonies run in their own processes,
+each with its own pheromone, and every exchange_interval iterations each colony sends
+its best path to its neighbor colonies. The exchange is asynchronous, a colony never
+waits for the others, so the throughput scales with the number of the cores.
+'''
+import os
+import queue
+import time
+
+import numpy as np
+
+from methods.ACO import ACO, create_shared_array, attach_shared_array
+from methods import numba_kernels
+
+class Migration:
+    '''
+    The observer of a colony, which exchanges the best paths with the neighbor colonies.
+    '''
+    def __init__(self, aco, exchange_interval, inbox, outboxes):
+        self.aco = aco
+        self.exchange_interval = exchange_interval
+        self.inbox = inbox
+        self.outboxes = outboxes
+        self.accepted = 0
+
+    def __call__(self, stats):
+        now_iter = stats["iteration"]
+        if stats["stop_reason"] is not None or (now_iter + 1) % self.exchange_interval != 0:
+            return
+        aco = self.aco
+        for outbox in self.outboxes:
+            outbox.put((aco.distance_best[now_iter], aco.path_best[now_iter]))
+        migrants = []
+        while True:
+            try:
+                migrants.append(self.inbox.get_nowait())
+            except queue.Empty:
+                break
+        if not migrants:
+            return
+        distance, path = min(migrants, key = lambda migrant: migrant[0])
+        if distance < aco.distance_best[now_iter]:
+            # the migrant becomes the best path of the colony, and its edges are reinforced.
+            aco.distance_best[now_iter] = distance
+            aco.path_best[now_iter] = path
+            aco.deposit_path(path, aco.Q / distance)
+            self.accepted += 1
+
+def run_colony(index, params, engine, method, specs, exchange_interval, inbox, outboxes, results):
+    '''
+    private methods, used in the MultiColony, don't use it outside.
+    Run one colony on the data in the shared memory, and put its result into results.
+    '''
+    # the migrants left in the queues are dropped when the colonies exit.
+    inbox.cancel_join_thread()
+    for outbox in outboxes:
+        outbox.cancel_join_thread()
+    blocks = []
+    data = {}
+    for name, spec in specs.items():
+        block, data[name] = attach_shared_array(spec)
+        blocks.append(block)
+    aco = ACO(**params)
+    migration = Migration(aco, exchange_interval, inbox, outboxes)
+    aco.observers.append(migration)
+    aco.input_data(data["city_pos"], data.get("distance_table"))
+    start = time.process_time()
+    path_best, distance_best, stop_reason = getattr(aco, engine + "_iteration")(method)
+    results.put(dict(index = index, path = path_best[-1].copy(), distance_best = distance_best.copy(),
+                     stop_reason = stop_reason, cpu_time = time.process_time() - start,
+                     accepted = migration.accepted))
+    # release the views before closing the shared memory.
+    aco = migration = data = None
+    for block in blocks:
+        block.close()
+
+class MultiColony:
+    def __init__(self, colony_count = 4, exchange_interval = 10, topology = "ring",
+                 engine = "batch", seed = None, show_progress = True, **params) -> None:
+        '''
+        colony_count: The number of the colonies, each runs in its own process.
+        exchange_interval: The number of the iterations between the exchanges of the best paths.
+        topology: "ring", each colony sends to the next one,
+                  or "full", each colony sends to all the other ones.
+        engine: The iteration of the colonies, "serial" or "batch".
+        seed: The seed of the colonies, colony i uses the seed [seed, i].
+        show_progress: Print the summary of the colonies after the iteration.
+        params: The parameters of the ACO of each colony, e.g. ant_count, MAX_iter.
+                The checkpoint_path of colony i is named "(root).colony(i)(ext)".
+        '''
+        if topology not in ("ring", "full"):
+            raise ValueError("Multi colony topology does not support!")
+        if engine not in ("serial", "batch"):
+            raise ValueError("Multi colony engine does not support!")
+        if colony_count < 1 or exchange_interval < 1:
+            raise ValueError("Multi colony needs colony_count >= 1 and exchange_interval >= 1!")
+        self.colony_count = colony_count
+        self.exchange_interval = exchange_interval
+        self.topology = topology
+        self.engine = engine
+        self.seed = np.random.SeedSequence(seed).entropy
+        self.show_progress = show_progress
+        self.params = params
+
+    def input_data(self, city_pos:np.ndarray, distance_table:np.ndarray = None):
+        '''
+        input the data, the same as ACO.input_data, it is shared by all the colonies.
+        '''
+        self.city_pos = np.asarray(city_pos, dtype = np.float64)
+        self.distance_table = distance_table
+
+    def colony_params(self, index):
+        '''
+        private methods, used in the iteration, don't use it outside.
+        Return the ACO parameters of the colony index.
+        '''
+        params = dict(self.params, seed = [self.seed, index], show_progress = False)
+        if params.get("checkpoint_path") is not None:
+            # each colony saves its own checkpoint.
+            root, ext = os.path.splitext(params["checkpoint_path"])
+            params["checkpoint_path"] = root + ".colony" + str(index) + ext
+        return params
+
+    def neighbors(self, index):
+        '''
+        private methods, used in the iteration, don't use it outside.
+        Return the colonies receiving the best paths of the colony index.
+        '''
+        if self.topology == "ring":
+            return [(index + 1) % self.colony_count] if self.colony_count > 1 else []
+        return [other for other in range(self.colony_count) if other != index]
+
+    def iteration(self, method = "cycle", reference = False):
+        '''
+        Run all the colonies, the method is the same as ACO.serial_iteration.
+        Return the best path of all the colonies, the distance_best list of the colony
+        which found it, and its stop reason.
+        The summary is kept in report, including the cpu_utilization, which is the total
+        CPU time of the colonies divided by the wall time, the average number of the busy cores.
+        reference: Run colony 0 alone first with the same parameters, and report the speedup,
+                   the iterations per second of all the colonies divided by the ones of the single colony.
+                   The speedup is None if reference is False.
+        '''
+        reference_iter_per_sec = None
+        if reference:
+            single = MultiColony(1, self.exchange_interval, self.topology, self.engine, self.seed,
+                                 show_progress = False, **dict(self.params, checkpoint_path = None))
+            single.input_data(self.city_pos, self.distance_table)
+            single.iteration(method)
+            reference_iter_per_sec = single.report["iter_per_sec"]
+
+        arrays = {"city_pos": self.city_pos}
+        if self.distance_table is not None:
+            arrays["distance_table"] = self.distance_table
+        context = numba_kernels.pool_context(self.params.get("backend"))
+        blocks = []
+        specs = {}
+        processes = []
+        try:
+            for name, array in arrays.items():
+                block, _, specs[name] = create_shared_array(np.asarray(array))
+                blocks.append(block)
+            inboxes = [context.Queue() for _ in range(self.colony_count)]
+            results = context.Queue()
+            start = time.perf_counter()
+            for index in range(self.colony_count):
+                outboxes = [inboxes[other] for other in self.neighbors(index)]
+                process = context.Process(target = run_colony,
+                                          args = (index, self.colony_params(index), self.engine, method, specs,
+                                                  self.exchange_interval, inboxes[index], outboxes, results))
+                process.start()
+                processes.append(process)
+            colonies = []
+            while len(colonies) < self.colony_count:
+                try:
+                    colonies.append(results.get(timeout = 1))
+                except queue.Empty:
+                    if any(process.exitcode not in (None, 0) for process in processes):
+                        raise RuntimeError("Multi colony process failed!")
+            wall_time = time.perf_counter() - start
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        colonies.sort(key = lambda colony: colony["index"])
+        best = min(colonies, key = lambda colony: colony["distance_best"][-1])
+        cpu_time = sum(colony["cpu_time"] for colony in colonies)
+        iter_count = sum(len(colony["distance_best"]) for colony in colonies)
+        self.colonies = colonies
+        self.report = dict(colony_count = self.colony_count, wall_time = wall_time, cpu_time = cpu_time,
+                           cpu_utilization = cpu_time / wall_time, iter_per_sec = iter_count / wall_time,
+                           speedup = None if reference_iter_per_sec is None else
+                                     iter_count / wall_time / reference_iter_per_sec,
+                           best_colony = best["index"], distance_best = float(best["distance_best"][-1]),
+                           accepted = [colony["accepted"] for colony in colonies])
+        if self.show_progress:
+            print("ACO multi colony: {colony_count} colonies, {iter_per_sec:.2f} it/s, "
+                  "cpu utilization {cpu_utilization:.2f}".format(**self.report) +
+                  ("" if self.report["speedup"] is None else ", speedup {:.2f}".format(self.report["speedup"])))
+        return best["path"], best["distance_best"], best["stop_reason"]
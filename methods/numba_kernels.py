@@ -0,0 +1,186 @@
+'''
+The optional numba kernels of the ACO, used by ACO(backend = "numba").
+The kernels are compiled with cache = True, so the compiled code is stored on disk
+and the later processes load it instead of compiling again.
+If numba is not installed, NUMBA_AVAILABLE is False and the NumPy engine is used.
+'''
+import multiprocessing
+
+import numpy as np
+try:
+    from numba import njit, prange, set_num_threads
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        '''
+        The placeholder of numba.njit, the kernels stay plain python functions.
+        '''
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+    prange = range
+
+    def set_num_threads(n):
+        '''
+        The placeholder of numba.set_num_threads.
+        '''
+
+def pool_context(backend):
+    '''
+    Return the multiprocessing context of the worker processes of the backend.
+    The threads of numba are not fork safe, so the workers are spawned with the numba backend,
+    otherwise the default context of the platform is used.
+    '''
+    return multiprocessing.get_context("spawn" if backend == "numba" else None)
+
+@njit(cache = True, parallel = True)
+def batch_select_path(choice, distance, candidate, rand, q0, length):
+    '''
+    Construct the paths of all the ants, the ants are processed in parallel.
+    The initial cities should be filled in the first column of candidate.
+    The city of step j is the first unvisit city whose cumulative choice weight
+    is greater than rand[i, j] * total weight, the same as roulette_select.
+    If rand[i, j] < q0, the unvisit city with the max choice weight is selected,
+    otherwise rand[i, j] is rescaled to (rand[i, j] - q0) / (1 - q0), the same as ACO.select_city.
+    The length of the paths are written into length.
+    '''
+    ant_count, city_count = candidate.shape
+    for i in prange(ant_count):
+        visited = np.zeros(city_count, dtype = np.bool_)
+        visit = candidate[i, 0]
+        visited[visit] = True
+        path_length = 0.0
+        for j in range(1, city_count):
+            k = -1
+            if rand[i, j] < q0:
+                best = -1.0
+                for c in range(city_count):
+                    if not visited[c] and choice[visit, c] > best:
+                        best = choice[visit, c]
+                        k = c
+            else:
+                total = 0.0
+                for c in range(city_count):
+                    if not visited[c]:
+                        total += choice[visit, c]
+                target = (rand[i, j] - q0) / (1 - q0) * total
+                cumsum = 0.0
+                last = -1
+                for c in range(city_count):
+                    if not visited[c]:
+                        cumsum += choice[visit, c]
+                        if choice[visit, c] > 0:
+                            last = c
+                        if cumsum > target:
+                            k = c
+                            break
+                if k < 0:
+                    k = last
+            if k < 0:
+                # all the choice weights are underflowed to 0.
+                for c in range(city_count):
+                    if not visited[c]:
+                        k = c
+                        break
+            candidate[i, j] = k
+            visited[k] = True
+            path_length += distance[visit, k]
+            visit = k
+        length[i] = path_length + distance[visit, candidate[i, 0]]
+
+@njit(cache = True, parallel = True)
+def batch_select_path_neighbor(choice, neighbor_list, pheromone, heuristic, alpha,
+                               distance, candidate, rand, q0, length):
+    '''
+    Construct the paths of all the ants with the neighbor lists, choice is NDArray(n*k).
+    q0 is the same as batch_select_path.
+    If all the candidates are visited, the unvisit city with the max choice weight
+    pheromone^alpha * heuristic is selected.
+    Return the number of the fallback steps.
+    '''
+    ant_count, city_count = candidate.shape
+    neighbor_count = neighbor_list.shape[1]
+    fallback = np.zeros(ant_count, dtype = np.int64)
+    for i in prange(ant_count):
+        visited = np.zeros(city_count, dtype = np.bool_)
+        visit = candidate[i, 0]
+        visited[visit] = True
+        path_length = 0.0
+        for j in range(1, city_count):
+            total = 0.0
+            inside = False
+            for s in range(neighbor_count):
+                if not visited[neighbor_list[visit, s]]:
+                    total += choice[visit, s]
+                    inside = True
+            k = -1
+            if inside and rand[i, j] < q0:
+                best = -1.0
+                for s in range(neighbor_count):
+                    c = neighbor_list[visit, s]
+                    if not visited[c] and choice[visit, s] > best:
+                        best = choice[visit, s]
+                        k = c
+            elif inside:
+                target = (rand[i, j] - q0) / (1 - q0) * total
+                cumsum = 0.0
+                for s in range(neighbor_count):
+                    c = neighbor_list[visit, s]
+                    if not visited[c]:
+                        cumsum += choice[visit, s]
+                        if choice[visit, s] > 0 or k < 0:
+                            k = c
+                        if cumsum > target:
+                            break
+            else:
+                best = -1.0
+                for c in range(city_count):
+                    if not visited[c]:
+                        weight = pheromone[visit, c] ** alpha * heuristic[visit, c]
+                        if weight > best:
+                            best = weight
+                            k = c
+                fallback[i] += 1
+            candidate[i, j] = k
+            visited[k] = True
+            path_length += distance[visit, k]
+            visit = k
+        length[i] = path_length + distance[visit, candidate[i, 0]]
+    return fallback.sum()
+
+@njit(cache = True)
+def deposit_pheromone(pheromone, candidate, incre_pheromone):
+    '''
+    Add incre_pheromone[i, j] to the edge from candidate[i, j] to the next city of the path.
+    The ants are processed serially, so the deposits on the same edge never race.
+    '''
+    ant_count, city_count = candidate.shape
+    for i in range(ant_count):
+        for j in range(city_count):
+            pheromone[candidate[i, j], candidate[i, (j + 1) % city_count]] += incre_pheromone[i, j]
+
+def warmup():
+    '''
+    Compile the kernels on a tiny instance, or load them from the cache on disk,
+    so the compile cost is not paid in the first iteration.
+    '''
+    if not NUMBA_AVAILABLE:
+        return
+    city_count = 4
+    pos = np.arange(city_count * 2, dtype = np.float64).reshape(city_count, 2)
+    distance = np.hypot(pos[:, None, 0] - pos[None, :, 0], pos[:, None, 1] - pos[None, :, 1])
+    np.fill_diagonal(distance, 9999999)
+    pheromone = np.ones((city_count, city_count))
+    reciprocal = 1.0 / distance
+    candidate = np.zeros((2, city_count), dtype = np.int64)
+    rand = np.full((2, city_count), 0.5)
+    length = np.zeros(2)
+    batch_select_path(pheromone * reciprocal, distance, candidate, rand, 0.0, length)
+    neighbor_list = np.argsort(distance, axis = 1)[:, :2]
+    choice = np.take_along_axis(pheromone * reciprocal, neighbor_list, axis = 1)
+    batch_select_path_neighbor(choice, neighbor_list, pheromone, reciprocal, 1.0,
+                               distance, candidate, rand, 0.0, length)
+    deposit_pheromone(pheromone, candidate, np.ones((2, city_count)))
@@ -0,0 +1,140 @@
+import argparse
+import csv
+import functools
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from datas.load_data import CityData
+from methods.ACO import ACO
+
+PARAM_NAMES = ["ant_count", "alpha", "beta", "rho", "Q", "MAX_iter"]
+INDEX_FIELDS = ["key", "dataset", "method", "engine", "seed"] + PARAM_NAMES + \
+               ["best_distance", "iter_count", "stop_reason", "load_time", "solve_time"]
+
+def key_value(value):
+    '''
+    private methods, used in the run_key, don't use it outside.
+    Return the name of the parameter value, the same number gives the same name
+    whether it is int or float, e.g. 1 and 1.0 are "1", 0.5 is "0.5".
+    '''
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def run_key(config):
+    '''
+    Return the unique name of the run, which is also the name of its .npz file.
+    '''
+    params = "_".join(name + key_value(config[name]) for name in PARAM_NAMES)
+    return "_".join([config["dataset"], config["method"], config["engine"], params, "seed" + str(config["seed"])])
+
+def expand_grid(datasets, methods, grid, seeds, engine = "batch"):
+    '''
+    Return the configs of the dataset * method * hyperparameter grid * seed sweep.
+    grid: dict of the ACO parameter name to the list of its values.
+    '''
+    names = list(grid)
+    configs = []
+    for dataset, method, values, seed in itertools.product(datasets, methods,
+                                                           itertools.product(*grid.values()), seeds):
+        config = dict(dataset = dataset, method = method, engine = engine, seed = seed)
+        config.update(zip(names, values))
+        configs.append(config)
+    return configs
+
+@functools.lru_cache(maxsize = None)
+def load_dataset(dataset):
+    '''
+    Load the dataset once in each worker process, the distance matrix is memory-mapped from the cache.
+    '''
+    city_data = CityData()
+    _, city_pos, distance_table = city_data.get_my_cities(os.path.join("datas", dataset + ".txt"))
+    return city_pos, distance_table
+
+def run_one(config):
+    '''
+    Run one config of the sweep without plotting.
+    Return the summary row and the arrays saved in the .npz file.
+    '''
+    start = time.perf_counter()
+    city_pos, distance_table = load_dataset(config["dataset"])
+    load_time = time.perf_counter() - start
+
+    aco = ACO(seed = config["seed"], show_progress = False, **{name: config[name] for name in PARAM_NAMES})
+    aco.input_data(city_pos, distance_table)
+    start = time.perf_counter()
+    path_best, distance_best, stop_reason = getattr(aco, config["engine"] + "_iteration")(config["method"])
+    solve_time = time.perf_counter() - start
+
+    row = dict(config, key = run_key(config), best_distance = distance_best[-1], iter_count = len(distance_best),
+               stop_reason = stop_reason, load_time = load_time, solve_time = solve_time)
+    arrays = dict(distance_best = distance_best, path_best = path_best[-1])
+    return row, arrays
+
+def load_index(store_dir):
+    '''
+    Return the keys of the finished runs, both the summary row and the .npz file should exist.
+    '''
+    index_path = os.path.join(store_dir, "index.csv")
+    if not os.path.exists(index_path):
+        return set()
+    with open(index_path, "r", newline = "") as f:
+        return {row["key"] for row in csv.DictReader(f)
+                if os.path.exists(os.path.join(store_dir, row["key"] + ".npz"))}
+
+def sweep(configs, store_dir = os.path.join("results", "sweep"), workers = None):
+    '''
+    Run the configs in a process pool, and store the results in store_dir:
+    index.csv: one summary row for each run,
+    <key>.npz: the distance curve and the best path of each run.
+    The finished runs are skipped, so an interrupted sweep can be resumed.
+    Return the summary rows of the runs in this call.
+    '''
+    os.makedirs(store_dir, exist_ok = True)
+    done = load_index(store_dir)
+    todo = [config for config in configs if run_key(config) not in done]
+    print("ACO sweep:", len(configs) - len(todo), "runs finished,", len(todo), "runs to do.")
+    index_path = os.path.join(store_dir, "index.csv")
+    new_index = not os.path.exists(index_path)
+    rows = []
+    with open(index_path, "a", newline = "") as f, ProcessPoolExecutor(max_workers = workers) as executor:
+        writer = csv.DictWriter(f, fieldnames = INDEX_FIELDS)
+        if new_index:
+            writer.writeheader()
+        futures = [executor.submit(run_one, config) for config in todo]
+        for future in as_completed(futures):
+            row, arrays = future.result()
+            # the .npz file is written before the summary row, the row marks the run as finished.
+            np.savez(os.path.join(store_dir, row["key"] + ".npz"), **arrays)
+            writer.writerow(row)
+            f.flush()
+            rows.append(row)
+            print(row["key"], "is", row["best_distance"])
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description = "Run the ACO sweep over datasets, methods, hyperparameters and seeds.")
+    parser.add_argument("--datasets", nargs = "+",
+                        default = ["oliver30", "dantzig42", "eil51", "berlin52", "st70", "pr107", "tsp225"])
+    parser.add_argument("--methods", nargs = "+", default = ["quantity", "density", "cycle", "constant"])
+    parser.add_argument("--engine", default = "batch", choices = ["serial", "batch", "parallel"])
+    parser.add_argument("--ant_count", nargs = "+", type = int, default = [100])
+    parser.add_argument("--alpha", nargs = "+", type = float, default = [1])
+    parser.add_argument("--beta", nargs = "+", type = float, default = [5])
+    parser.add_argument("--rho", nargs = "+", type = float, default = [0.5])
+    parser.add_argument("--Q", nargs = "+", type = float, default = [50])
+    parser.add_argument("--MAX_iter", nargs = "+", type = int, default = [200])
+    parser.add_argument("--seeds", nargs = "+", type = int, default = [0])
+    parser.add_argument("--workers", type = int, default = None)
+    parser.add_argument("--store", default = os.path.join("results", "sweep"))
+    args = parser.parse_args()
+
+    grid = {name: getattr(args, name) for name in PARAM_NAMES}
+    configs = expand_grid(args.datasets, args.methods, grid, args.seeds, args.engine)
+    sweep(configs, args.store, args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,24 @@
-with open("datas\\dantzig42.txt","r+",encoding="UTF-8") as f:
-    lines = f.readlines()
-    newlines = []
-    for line in lines:
-        words = line.split(" ")
-        newline = ",".join(words)
-        newlines.append(newline)
-    f.writelines(newlines)
\ No newline at end of file
+import sys
+import numpy as np
+from datas import tsplib
+
+def convert(load_file_path, save_file_path):
+    '''
+    Convert the TSPLIB .tsp file, or the "(cityname) (longtitude) (latitude)" file
+    separated by the spaces, to the data format of datas/readme.md.
+    '''
+    if load_file_path.endswith(".tsp"):
+        city_pos = tsplib.read_tsplib(load_file_path)[1]
+        city_name = np.arange(1, len(city_pos) + 1).astype(str)
+    else:
+        # the file is read once, the names and the positions are split from the same lines.
+        lines = np.loadtxt(load_file_path, dtype = str, usecols = (0, 1, 2), ndmin = 2, encoding = "UTF-8")
+        city_name = lines[:, 0]
+        city_pos = lines[:, 1:3].astype(np.float64)
+    with open(save_file_path, "w", encoding = "UTF-8") as f:
+        for name, (x, y) in zip(city_name, city_pos.tolist()):
+            # repr keeps all the digits of the coordinates.
+            f.write(name + "," + repr(x) + "," + repr(y) + "\n")
+
+if __name__ == "__main__":
+    convert(sys.argv[1], sys.argv[2])
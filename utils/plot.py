@@ -1,27 +1,38 @@
+import os
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.rcParams['font.family'] = 'STSong'
 
-def plot_path(x:list, y:list, path:list, savefig="results\\result_path.png", method="", dataset=""):
+def plot_path(x:list, y:list, path:list, savefig=os.path.join("results", "result_path.png"), method="", dataset="", fig=None):
     '''
     Plot the best path.
+    If fig is given, it is cleared and reused, otherwise a new figure is created and closed after saving.
     '''
-    plt.figure()
-    plt.plot(x, y, '-o')
-    plt.title(dataset +" " + method + " Best path graph")
-    plt.xlabel("Longitude")
-    plt.ylabel("Latitude")
+    figure = plt.figure() if fig is None else fig
+    figure.clf()
+    ax = figure.add_subplot()
+    ax.plot(x, y, '-o')
+    ax.set_title(dataset +" " + method + " Best path graph")
+    ax.set_xlabel("Longitude")
+    ax.set_ylabel("Latitude")
     for i in range(len(path)):
-        plt.annotate(path[i], xy=(x[i], y[i]), xytext=(x[i] + 0.3, y[i] + 0.3))
-    plt.savefig(savefig)
+        ax.annotate(path[i], xy=(x[i], y[i]), xytext=(x[i] + 0.3, y[i] + 0.3))
+    figure.savefig(savefig)
+    if fig is None:
+        plt.close(figure)
     
-def plot_dist(distance:list, savefig="results\\result_dist.png", method="", dataset=""):
+def plot_dist(distance:list, savefig=os.path.join("results", "result_dist.png"), method="", dataset="", fig=None):
     '''
     Plot the distance iteration condition.
+    If fig is given, it is cleared and reused, otherwise a new figure is created and closed after saving.
     '''
-    plt.figure()
-    plt.plot(range(1, len(distance) + 1), distance)
-    plt.title(dataset +" " + method + " Distance iteration graph")
-    plt.xlabel("Number of iterations")
-    plt.ylabel("Distance value")
-    plt.savefig(savefig)
\ No newline at end of file
+    figure = plt.figure() if fig is None else fig
+    figure.clf()
+    ax = figure.add_subplot()
+    ax.plot(range(1, len(distance) + 1), distance)
+    ax.set_title(dataset +" " + method + " Distance iteration graph")
+    ax.set_xlabel("Number of iterations")
+    ax.set_ylabel("Distance value")
+    figure.savefig(savefig)
+    if fig is None:
+        plt.close(figure)
@@ -0,0 +1,128 @@
+'''
+The rendering stage of the plots, so the solves don't wait for the PNG rendering.
+The plots are sent through a bounded queue to a background process, which uses the
+non-interactive Agg backend and reuses one figure for all the plots.
+matplotlib is only imported where the plots are rendered, the headless mode never imports it.
+'''
+import multiprocessing
+import queue
+import sys
+import time
+import warnings
+
+import numpy as np
+
+def render_worker(tasks):
+    '''
+    private methods, used in the Renderer, don't use it outside.
+    Render the plots from the queue until None is received.
+    '''
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from utils import plot
+    figure = plt.figure()
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        name, args, kwargs = task
+        try:
+            getattr(plot, name)(*args, fig = figure, **kwargs)
+        except Exception as error:
+            print("Render " + name + " failed:", repr(error), file = sys.stderr)
+    plt.close(figure)
+
+class Renderer:
+    def __init__(self, mode = "background", max_pending = 16) -> None:
+        '''
+        mode: "background", the plots are rendered in a background process,
+              "inline", the plots are rendered in this process before the call returns,
+              "headless", the plots are skipped.
+        max_pending: The max number of the plots waiting in the queue,
+                     the caller waits when the background process falls behind.
+        '''
+        if mode not in ("background", "inline", "headless"):
+            raise ValueError("Render mode does not support!")
+        self.mode = mode
+        self.process = None
+        if mode == "background":
+            # a fresh process, so the backend of the caller doesn't matter.
+            context = multiprocessing.get_context("spawn")
+            self.tasks = context.Queue(maxsize = max_pending)
+            self.process = context.Process(target = render_worker, args = (self.tasks,), daemon = True)
+            self.process.start()
+
+    def submit(self, name, *args, **kwargs):
+        '''
+        private methods, used in the plot methods, don't use it outside.
+        '''
+        if self.mode == "headless":
+            return
+        if self.mode == "inline":
+            from utils import plot
+            getattr(plot, name)(*args, **kwargs)
+            return
+        # the arrays are copied, so the caller can reuse them before the task is sent.
+        args = [np.array(arg) if isinstance(arg, np.ndarray) else arg for arg in args]
+        # the queue is never refilled by a dead process, so it is checked while waiting.
+        while self.process.is_alive():
+            try:
+                self.tasks.put((name, args, kwargs), timeout = 1)
+                return
+            except queue.Full:
+                pass
+        self.fallback()
+
+    def fallback(self):
+        '''
+        private methods, used in the Renderer, don't use it outside.
+        Skip the plots after the background process exited, e.g. matplotlib can't be imported.
+        '''
+        warnings.warn("The render process exited with code {}, the plots are skipped!".format(self.process.exitcode))
+        # the tasks left in the queue are never read, don't wait for them at exit.
+        self.tasks.cancel_join_thread()
+        self.process = None
+        self.mode = "headless"
+
+    def plot_path(self, *args, **kwargs):
+        '''
+        Plot the best path, the same arguments as utils.plot.plot_path.
+        '''
+        self.submit("plot_path", *args, **kwargs)
+
+    def plot_dist(self, *args, **kwargs):
+        '''
+        Plot the distance iteration condition, the same arguments as utils.plot.plot_dist.
+        '''
+        self.submit("plot_dist", *args, **kwargs)
+
+    def close(self, timeout = 60):
+        '''
+        Wait until all the plots are rendered, and stop the background process.
+        timeout: The max seconds to wait, the background process is terminated after it.
+        '''
+        if self.process is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self.process.is_alive() and time.monotonic() < deadline:
+            try:
+                self.tasks.put(None, timeout = 1)
+                break
+            except queue.Full:
+                pass
+        self.process.join(max(0, deadline - time.monotonic()))
+        if self.process.is_alive():
+            warnings.warn("The render process doesn't finish in {} s, it is terminated!".format(timeout))
+            self.process.terminate()
+            self.process.join()
+        elif self.process.exitcode != 0:
+            warnings.warn("The render process exited with code {}!".format(self.process.exitcode))
+        self.tasks.cancel_join_thread()
+        self.process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,86 @@
+'''
+The observers of the ACO iterations, passed by ACO(observers = [...]).
+An observer is a callable, it is called once per iteration with the stats dict:
+    name: the iteration, "serial", "batch" or "parallel"
+    iteration: the index of the iteration
+    elapsed: the seconds since the iteration started
+    phase_time: dict of the phase to its wall time in this iteration
+    distance_best: the best distance until this iteration
+    length_mean, length_std: the mean and the standard deviation of the ant path lengths
+    pheromone_min, pheromone_max: the range of the pheromone
+    fallback_count: the steps whose neighbor candidates were exhausted
+    peak_memory_mb: the peak resident memory of the process, None if it can't be measured
+    stop_reason: None, or the stop reason in the last iteration
+'''
+import collections
+import json
+import sys
+
+from tqdm import tqdm
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def peak_memory():
+    '''
+    Return the peak resident memory in MB of this process and of its finished child processes,
+    None if it can't be measured on the platform.
+    '''
+    if resource is None:
+        return None, None
+    # ru_maxrss is KB on Linux, but bytes on macOS.
+    scale = 1.0 / 1024 if sys.platform != "darwin" else 1.0 / 1024 / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale, \
+           resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+
+class ProgressSink:
+    '''
+    Show the progress of the iteration with the tqdm progress bar.
+    '''
+    def __init__(self, total, name = ""):
+        print("ACO " + name + " iteration progress:")
+        self.bar = tqdm(total = total)
+
+    def __call__(self, stats):
+        self.bar.update(1)
+        if stats["stop_reason"] is not None:
+            self.bar.close()
+
+class JsonLinesSink:
+    '''
+    Write the stats of each iteration as one JSON line, the file is line buffered,
+    so it can be watched (e.g. tail -f) while the iteration runs.
+    The sink can be reused by several iterations, e.g. ACO.resume, close it after them,
+    or use it in the with statement.
+    '''
+    def __init__(self, path, mode = "w"):
+        self.file = open(path, mode, buffering = 1)
+
+    def __call__(self, stats):
+        self.file.write(json.dumps(stats) + "\n")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class RingBufferSink:
+    '''
+    Keep the stats of the last size iterations in memory.
+    '''
+    def __init__(self, size = 1000):
+        self.records = collections.deque(maxlen = size)
+
+    def __call__(self, stats):
+        self.records.append(stats)
+
+    def latest(self):
+        '''
+        Return the stats of the last iteration, None if no iteration ran.
+        '''
+        return self.records[-1] if self.records else None